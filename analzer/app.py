@@ -1,17 +1,18 @@
 from flask import Flask, request, jsonify, render_template
-import torch
-from transformers import BertTokenizer
 import os
-import json
+import functools
+import threading
+from concurrent.futures.process import BrokenProcessPool
 from werkzeug.utils import secure_filename
-from model import MedicalTransformer, MedicalResponseGenerator
-from data_processor import MedicalDataProcessor
 import logging
-from config import MODEL_CONFIG, FILE_PATHS
-import PyPDF2
-import docx
-import pytesseract
-from PIL import Image
+from config import APP_CONFIG, FILE_PATHS, DOCUMENT_CACHE_CONFIG
+from startup_profile import StartupProfile
+from text_extraction import ExtractionPool, ExtractionBusyError, ExtractionTimeoutError, spool_upload
+from document_cache import DocumentCache, content_digest
+from tokenizer_registry import get_tokenizer
+
+# Time each startup component from here on
+startup = StartupProfile()
 
 # Configure logging
 logging.basicConfig(
@@ -26,32 +27,81 @@ logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 
-# Configure upload folder
-UPLOAD_FOLDER = 'uploads'
+# Configure uploads
 ALLOWED_EXTENSIONS = {'txt', 'pdf', 'doc', 'docx', 'png', 'jpg', 'jpeg', 'bmp'}
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 
-# Configure Tesseract path
-if os.name == 'nt':  # Windows
-    pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
-else:  # Linux/Mac
-    pytesseract.pytesseract.tesseract_cmd = 'tesseract'
-
 # Create required directories
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs('logs', exist_ok=True)
 os.makedirs(os.path.dirname(FILE_PATHS["model_save_path"]), exist_ok=True)
 
-# Initialize model and processors
-try:
-    tokenizer = BertTokenizer.from_pretrained('bert-base-uncased')
-    data_processor = MedicalDataProcessor()
-    response_generator = MedicalResponseGenerator(model_path=FILE_PATHS["model_save_path"])
-    logger.info("Model and processors initialized successfully")
-except Exception as e:
-    logger.error(f"Error initializing model: {str(e)}")
-    raise
+# Text extraction workers, the upload cache, and the model and processors
+# set once initialize() has loaded them
+extraction_pool = None
+document_cache = None
+data_processor = None
+response_generator = None
+
+def initialize():
+    """Load the model, tokenizer and NLTK data, timing each component."""
+    global data_processor, response_generator
+
+    try:
+        with startup.component('model_code'):
+            # torch, transformers and scikit-learn are imported here
+            from model import MedicalResponseGenerator
+            from data_processor import MedicalDataProcessor
+
+        with startup.component('tokenizer'):
+            get_tokenizer()
+
+        with startup.component('model'):
+            generator = MedicalResponseGenerator(model_path=FILE_PATHS["model_save_path"])
+
+        with startup.component('nltk'):
+            processor = MedicalDataProcessor()
+            # Loads the stopwords and WordNet data
+            processor.clean_text("warming up")
+
+        data_processor = processor
+        response_generator = generator
+        startup.mark_ready()
+        logger.info("Model and processors initialized successfully")
+    except Exception as e:
+        logger.error(f"Error initializing model: {str(e)}")
+        startup.mark_failed(e)
+
+# Extraction workers started with forkserver or spawn import this module again
+# as __mp_main__; only the server process starts the service
+if __name__ != '__mp_main__':
+    # Start the text extraction workers before loading the model
+    with startup.component('extraction_pool'):
+        extraction_pool = ExtractionPool()
+
+    # Reuse text and analyses of documents uploaded before
+    if DOCUMENT_CACHE_CONFIG["enabled"]:
+        with startup.component('document_cache'):
+            document_cache = DocumentCache(DOCUMENT_CACHE_CONFIG["path"], max_bytes=DOCUMENT_CACHE_CONFIG["max_bytes"])
+
+    # Load in the background so the server starts answering readiness checks at once
+    if APP_CONFIG["background_startup"]:
+        threading.Thread(target=initialize, name='startup', daemon=True).start()
+    else:
+        initialize()
+        if startup.error is not None:
+            raise startup.error
+
+def requires_ready(view):
+    """Answer 503 until the model and processors are loaded."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if not startup.ready:
+            return jsonify({
+                'success': False,
+                'error': 'The service is starting, please retry shortly'
+            }), 503
+        return view(*args, **kwargs)
+    return wrapper
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -61,6 +111,7 @@ def home():
     return render_template('index.html')
 
 @app.route('/api/upload', methods=['POST'])
+@requires_ready
 def upload_file():
     try:
         if 'file' not in request.files:
@@ -72,36 +123,61 @@ def upload_file():
         
         if file and allowed_file(file.filename):
             filename = secure_filename(file.filename)
-            filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            file.save(filepath)
+            
+            file_type = filename.rsplit('.', 1)[1].lower()
             
             try:
-                # Extract text from file
-                text = extract_text_from_file(filepath, filename)
+                # Keep the upload in memory (or a private temporary file if large)
+                # and extract its text in worker processes, page by page for PDFs
+                with spool_upload(file.stream) as source:
+                    digest = content_digest(source) if document_cache is not None else None
+                    cached = document_cache.get(digest, file_type) if digest else None
+                    if cached is not None:
+                        pages = cached['pages']
+                    else:
+                        pages = extraction_pool.extract_pages(source, filename)
+                text = ' '.join(pages)
                 
-                if not text:
+                if not text.strip():
                     raise ValueError("Could not extract text from file")
 
-                # Process the text
-                cleaned_text = data_processor.clean_text(text)
-                response = response_generator.generate_response(cleaned_text, tokenizer)
-                
-                # Clean up
-                os.remove(filepath)
+                # Analyses are only reused if the same model produced them, and
+                # are not kept at all without a trained model file
+                model_version = response_generator.model_version
+                from_cache = (cached is not None and model_version is not None
+                              and cached['model_version'] == model_version)
+                if from_cache:
+                    response = cached['analysis']
+                else:
+                    # Process the text
+                    cleaned_text = data_processor.clean_text(text)
+                    response = response_generator.generate_response(cleaned_text)
+                    if digest:
+                        if model_version is not None:
+                            document_cache.put(digest, file_type, pages, model_version, response)
+                        else:
+                            document_cache.put(digest, file_type, pages)
                 
                 return jsonify({
                     'success': True,
                     'filename': filename,
+                    'cached': from_cache,
+                    'pages': len(pages),
                     'analysis': {
                         'response': response
                     }
                 })
             
+            except (ExtractionBusyError, ExtractionTimeoutError, BrokenProcessPool) as e:
+                logger.warning(f"Could not extract text from {filename}: {str(e)}")
+                status = 504 if isinstance(e, ExtractionTimeoutError) else 503
+                return jsonify({
+                    'success': False,
+                    'error': str(e)
+                }), status
+
             except Exception as e:
                 logger.error(f"Error processing file {filename}: {str(e)}")
-                # Clean up on error
-                if os.path.exists(filepath):
-                    os.remove(filepath)
                 return jsonify({
                     'success': False,
                     'error': f"Error processing file: {str(e)}"
@@ -119,42 +195,8 @@ def upload_file():
             'error': 'An error occurred while processing your file'
         }), 500
 
-def extract_text_from_file(filepath, filename):
-    """Extract text from various file formats including images."""
-    file_type = filename.rsplit('.', 1)[1].lower()
-    
-    try:
-        # Handle image files
-        if file_type in ['png', 'jpg', 'jpeg', 'bmp']:
-            image = Image.open(filepath)
-            # Perform OCR on the image
-            text = pytesseract.image_to_string(image)
-            return text.strip()
-            
-        # Handle text files
-        elif file_type == 'txt':
-            with open(filepath, 'r', encoding='utf-8') as f:
-                return f.read()
-            
-        # Handle PDF files
-        elif file_type == 'pdf':
-            text = []
-            with open(filepath, 'rb') as f:
-                pdf_reader = PyPDF2.PdfReader(f)
-                for page in pdf_reader.pages:
-                    text.append(page.extract_text())
-            return ' '.join(text)
-            
-        # Handle Word documents
-        elif file_type in ['doc', 'docx']:
-            doc = docx.Document(filepath)
-            return ' '.join([paragraph.text for paragraph in doc.paragraphs])
-            
-    except Exception as e:
-        logger.error(f"Error extracting text from {filename}: {str(e)}")
-        raise ValueError(f"Could not extract text from {filename}")
-
 @app.route('/api/chat', methods=['POST'])
+@requires_ready
 def chat():
     try:
         data = request.get_json()
@@ -165,7 +207,7 @@ def chat():
         
         # Process the message
         cleaned_text = data_processor.clean_text(message)
-        response = response_generator.generate_response(cleaned_text, tokenizer)
+        response = response_generator.generate_response(cleaned_text)
         
         return jsonify({
             'success': True,
@@ -179,5 +221,20 @@ def chat():
             'error': 'An error occurred while processing your message'
         }), 500
 
+@app.route('/api/ready', methods=['GET'])
+def ready():
+    """Readiness check with the cold-start timing of each component."""
+    return jsonify(startup.report()), 200 if startup.ready else 503
+
+@app.route('/api/stats', methods=['GET'])
+@requires_ready
+def stats():
+    cache = response_generator.cache
+    return jsonify({
+        'success': True,
+        'response_cache': cache.stats() if cache is not None else None,
+        'document_cache': document_cache.stats() if document_cache is not None else None
+    })
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True) 
\ No newline at end of file
@@ -0,0 +1,490 @@
+"""
+Benchmarks for the medical chatbot's hot paths.
+
+Each subcommand times one component and prints a short report, e.g.:
+
+    python benchmark.py batching --threads 16 --requests 512
+"""
+
+import argparse
+import statistics
+import threading
+import time
+
+def _percentile(values, pct):
+    """Return the given percentile of a list of values."""
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+def _report(name, latencies, elapsed):
+    """Print throughput and latency statistics for a run."""
+    print(f"{name}: {len(latencies) / elapsed:.1f} req/s, "
+          f"p50 {statistics.median(latencies) * 1000:.1f} ms, "
+          f"p99 {_percentile(latencies, 99) * 1000:.1f} ms")
+
+def bench_batching(args):
+    """Compare concurrent model predictions with and without micro-batching."""
+    from tokenizer_registry import get_tokenizer
+    from model import MedicalResponseGenerator
+    from config import INFERENCE_CONFIG
+
+    tokenizer = get_tokenizer()
+    # Queries without rule-based keywords so every request reaches the model
+    queries = [f"sample patient note number {i} describing general symptoms" for i in range(args.requests)]
+
+    for enable_batching in (False, True):
+        INFERENCE_CONFIG["enable_batching"] = enable_batching
+        generator = MedicalResponseGenerator(model_path=args.model)
+        latencies = []
+        lock = threading.Lock()
+
+        def worker(chunk):
+            for query in chunk:
+                start = time.perf_counter()
+                generator.predict_category(query, tokenizer)
+                with lock:
+                    latencies.append(time.perf_counter() - start)
+
+        chunks = [queries[i::args.threads] for i in range(args.threads)]
+        threads = [threading.Thread(target=worker, args=(chunk,)) for chunk in chunks]
+
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        _report("batched" if enable_batching else "unbatched", latencies, elapsed)
+
+        if generator.batcher is not None:
+            generator.batcher.close()
+
+def _load_document(path, repeat):
+    """Read a sample document and repeat it to simulate a long OCR'd report."""
+    with open(path, 'r', encoding='utf-8') as f:
+        return (f.read() + '\n') * repeat
+
+def _legacy_query_category(text):
+    """Keyword lookup as previously done in generate_response."""
+    from config import KEYWORD_CATEGORIES
+
+    for keyword, category in KEYWORD_CATEGORIES.items():
+        if keyword in text:
+            return category
+    return None
+
+def _legacy_entity_categories(text):
+    """Category lookup as previously done in extract_medical_entities."""
+    from config import CATEGORY_KEYWORDS, COMMON_SYMPTOMS
+
+    categories = []
+    for category, keywords in CATEGORY_KEYWORDS.items():
+        for keyword in keywords:
+            if keyword in text:
+                categories.append(category)
+                break
+    for category, symptoms in COMMON_SYMPTOMS.items():
+        for symptom in symptoms:
+            if symptom in text and category not in categories:
+                categories.append(category)
+                break
+    return set(categories)
+
+def _time_call(fn, text, rounds):
+    """Return the best per-call time of fn(text) over several rounds."""
+    best = float('inf')
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def bench_keywords(args):
+    """Compare the compiled keyword matcher with the per-keyword loops."""
+    import keyword_matcher
+    from keyword_matcher import QUERY_CATEGORY_MATCHER, ENTITY_CATEGORY_MATCHER
+
+    engine = "aho-corasick" if keyword_matcher.ahocorasick is not None else "regex"
+    print(f"matcher engine: {engine}")
+
+    for repeat in args.repeat:
+        text = _load_document(args.file, repeat).lower()
+        # A miss scans the whole text, which is the worst case for both
+        miss = text.replace('cold', 'c0ld')
+
+        for label, sample in (("document", text), ("no-early-hit", miss)):
+            assert QUERY_CATEGORY_MATCHER.first_label(sample) == _legacy_query_category(sample)
+            assert ENTITY_CATEGORY_MATCHER.labels(sample) == _legacy_entity_categories(sample)
+
+            legacy = _time_call(_legacy_query_category, sample, args.rounds) + \
+                _time_call(_legacy_entity_categories, sample, args.rounds)
+            matcher = _time_call(QUERY_CATEGORY_MATCHER.first_label, sample, args.rounds) + \
+                _time_call(ENTITY_CATEGORY_MATCHER.labels, sample, args.rounds)
+            print(f"{len(sample):>9} chars {label:<13} legacy {legacy * 1000:8.2f} ms  "
+                  f"matcher {matcher * 1000:8.2f} ms")
+
+def _load_generator(args):
+    """Build an unbatched MedicalResponseGenerator for single-threaded timing."""
+    from model import MedicalResponseGenerator, MedicalTransformer
+    from config import INFERENCE_CONFIG
+
+    INFERENCE_CONFIG["enable_batching"] = False
+    generator = MedicalResponseGenerator(model_path=args.model)
+    if args.model_name:
+        generator.model = MedicalTransformer(model_name=args.model_name).to(generator.device).eval()
+    return generator
+
+def bench_padding(args):
+    """Compare fixed max_length padding with bucketed dynamic padding."""
+    from tokenizer_registry import get_tokenizer
+    from config import INFERENCE_CONFIG
+
+    tokenizer = get_tokenizer(args.model_name)
+    generator = _load_generator(args)
+    max_length = generator.max_seq_length
+    # Typical chat messages of 10-20 tokens
+    queries = [
+        "I have had a dull ache in my lower back for two weeks",
+        "What are the common treatments for persistent dry cough at night",
+        "My doctor mentioned anemia but I do not understand what it means",
+        "Is it serious if I keep feeling tired after sleeping eight hours"
+    ]
+
+    settings = (
+        ("fixed 128", 128, [128]),
+        (f"bucketed (max {max_length})", max_length, INFERENCE_CONFIG["padding_buckets"])
+    )
+
+    for batch_size in args.batch_sizes:
+        batch = (queries * batch_size)[:batch_size]
+        for label, length, buckets in settings:
+            generator.max_seq_length = length
+            INFERENCE_CONFIG["padding_buckets"] = buckets
+            generator.predict_categories(batch, tokenizer)  # warm up
+
+            latencies = []
+            for _ in range(args.rounds):
+                start = time.perf_counter()
+                generator.predict_categories(batch, tokenizer)
+                latencies.append(time.perf_counter() - start)
+            print(f"batch {batch_size:>2} {label:<22} median {statistics.median(latencies) * 1000:7.2f} ms")
+
+def _median_latency(fn, rounds):
+    """Return the median wall time of fn() over several rounds, after one warm-up call."""
+    fn()
+    latencies = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+    return statistics.median(latencies)
+
+def bench_onnx(args):
+    """Check ONNX Runtime parity with PyTorch and compare their latency."""
+    import os
+    import tempfile
+    import torch
+    from tokenizer_registry import get_tokenizer
+    from model import MedicalModelTrainer
+    from onnx_backend import export_to_onnx, OnnxMedicalClassifier
+
+    model = MedicalModelTrainer.load_model(args.model).eval()
+    tokenizer = get_tokenizer(args.tokenizer)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        onnx_path = export_to_onnx(model, os.path.join(tmp_dir, 'model.onnx'))
+        session = OnnxMedicalClassifier(onnx_path)
+
+        sentence = "persistent cough with mild fever and chest tightness for several days"
+        for batch_size in args.batch_sizes:
+            # Vary lengths within the batch so padding and masking are exercised
+            queries = [' '.join(sentence.split()[:3 + i % 8]) for i in range(batch_size)]
+            inputs = dict(tokenizer(queries, padding='longest', return_tensors='pt'))
+
+            with torch.no_grad():
+                torch_logits = model(**inputs)['logits']
+            onnx_logits = session(**inputs)['logits']
+
+            max_diff = (torch_logits - onnx_logits).abs().max().item()
+            assert max_diff <= args.tolerance, f"ONNX logits differ by {max_diff:.2e}"
+            assert torch.equal(torch_logits.argmax(dim=1), onnx_logits.argmax(dim=1))
+
+            def run_torch():
+                with torch.no_grad():
+                    model(**inputs)
+
+            torch_time = _median_latency(run_torch, args.rounds)
+            onnx_time = _median_latency(lambda: session(**inputs), args.rounds)
+            print(f"batch {batch_size:>2}: max |diff| {max_diff:.1e}  "
+                  f"torch {torch_time * 1000:7.2f} ms  onnxruntime {onnx_time * 1000:7.2f} ms")
+
+def bench_quantize(args):
+    """Compare weight size and CPU latency of fp32 and dynamic int8 models."""
+    import copy
+    import torch
+    from model import MedicalModelTrainer, quantize_model, model_size_mb
+
+    model = MedicalModelTrainer.load_model(args.model).cpu().eval()
+    quantized = quantize_model(copy.deepcopy(model))
+    print(f"weights: fp32 {model_size_mb(model):.1f} MB  int8 {model_size_mb(quantized):.1f} MB")
+
+    for batch_size in args.batch_sizes:
+        inputs = {
+            'input_ids': torch.randint(0, model.bert.config.vocab_size, (batch_size, args.seq_length)),
+            'attention_mask': torch.ones(batch_size, args.seq_length, dtype=torch.long)
+        }
+
+        def run(m):
+            with torch.no_grad():
+                return m(**inputs)['logits']
+
+        fp32_time = _median_latency(lambda: run(model), args.rounds)
+        int8_time = _median_latency(lambda: run(quantized), args.rounds)
+        agreement = (run(model).argmax(dim=1) == run(quantized).argmax(dim=1)).float().mean().item()
+        print(f"batch {batch_size:>2} x {args.seq_length}: fp32 {fp32_time * 1000:7.2f} ms  "
+              f"int8 {int8_time * 1000:7.2f} ms  argmax agreement {agreement:.2f}")
+
+def _legacy_clean_text(text, lemmatizer, stop_words):
+    """Clean text with per-token NLTK calls, as MedicalDataProcessor.clean_text used to."""
+    import re
+    from nltk.tokenize import word_tokenize
+
+    text = re.sub(r'[^a-zA-Z\s]', '', text.lower())
+    tokens = word_tokenize(text)
+    return ' '.join([lemmatizer.lemmatize(token) for token in tokens if token not in stop_words])
+
+def bench_clean(args):
+    """Check the fast text normalizer against the NLTK pipeline and compare throughput."""
+    import pandas as pd
+    from nltk.corpus import stopwords
+    from nltk.stem import WordNetLemmatizer
+    from config import FILE_PATHS
+    from text_normalizer import TextNormalizer, TREEBANK_SPLITS
+
+    texts = pd.read_csv(args.data or FILE_PATHS["synthetic_data_path"])['query'].astype(str).tolist()
+    texts.append(_load_document(args.file, 1))
+    # Contractions split by the Treebank tokenizer, in and out of word boundaries
+    texts.append(' '.join(f"I {word}, {word}! un{word} {word}s 2{word}" for word in TREEBANK_SPLITS))
+    texts = texts * args.repeat
+
+    lemmatizer = WordNetLemmatizer()
+    stop_words = set(stopwords.words('english'))
+    normalizer = TextNormalizer()
+
+    start = time.perf_counter()
+    expected = [_legacy_clean_text(text, lemmatizer, stop_words) for text in texts]
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    cleaned = normalizer.normalize_batch(texts)
+    fast_time = time.perf_counter() - start
+
+    mismatches = [(text, want, got) for text, want, got in zip(texts, expected, cleaned) if want != got]
+    for text, want, got in mismatches[:5]:
+        print(f"MISMATCH {text[:60]!r}: {want[:60]!r} != {got[:60]!r}")
+    assert not mismatches, f"{len(mismatches)} of {len(texts)} texts differ"
+
+    print(f"{len(texts)} texts identical")
+    print(f"nltk: {len(texts) / legacy_time:10.0f} texts/s")
+    print(f"fast: {len(texts) / fast_time:10.0f} texts/s  ({normalizer.cache_info()})")
+
+# Preprocessing settings compared by the OCR benchmark, as OCR_CONFIG overrides
+OCR_SETTINGS = [
+    ('raw', {'preprocess': False}),
+    ('downscale', {'grayscale': False, 'binarize': False, 'deskew': False}),
+    ('grayscale', {'grayscale': True, 'binarize': False, 'deskew': False}),
+    ('binarize', {'binarize': True, 'deskew': False}),
+    ('binarize+deskew', {'binarize': True, 'deskew': True})
+]
+
+def _char_accuracy(reference, text):
+    """Return the character-level similarity of OCR output to a reference transcript."""
+    import difflib
+
+    reference = ' '.join(reference.split())
+    text = ' '.join(text.split())
+    if not reference:
+        return 1.0 if not text else 0.0
+    return difflib.SequenceMatcher(None, reference, text, autojunk=False).ratio()
+
+def bench_ocr(args):
+    """Compare OCR time and character accuracy across preprocessing settings."""
+    import os
+    from PIL import Image
+    from ocr_engine import create_ocr_engine
+    from ocr_preprocessing import preprocess_image
+
+    engine = create_ocr_engine(args.engine)
+
+    # Each fixture is an image with a .txt transcript of the same name
+    fixtures = []
+    for name in sorted(os.listdir(args.fixtures)):
+        stem, ext = os.path.splitext(name)
+        transcript = os.path.join(args.fixtures, stem + '.txt')
+        if ext.lower() in ('.png', '.jpg', '.jpeg', '.bmp') and os.path.exists(transcript):
+            with open(transcript, 'r', encoding='utf-8') as f:
+                fixtures.append((os.path.join(args.fixtures, name), f.read()))
+
+    if not fixtures:
+        raise SystemExit(f"No image/.txt fixture pairs found in {args.fixtures}")
+
+    print(f"{len(fixtures)} fixtures, {type(engine).__name__}")
+    for setting, overrides in OCR_SETTINGS:
+        times, accuracies = [], []
+        for image_path, reference in fixtures:
+            def run():
+                with Image.open(image_path) as image:
+                    return engine.image_to_string(preprocess_image(image, overrides))
+
+            text = run()
+            times.append(_median_latency(run, args.rounds))
+            accuracies.append(_char_accuracy(reference, text))
+
+        print(f"{setting:>16}: mean {statistics.mean(times) * 1000:8.1f} ms  "
+              f"max {max(times) * 1000:8.1f} ms  char accuracy {statistics.mean(accuracies):.3f}")
+
+def _legacy_extract_entities(text):
+    """Entity extraction as previously done in extract_medical_entities, one findall per pattern."""
+    import re
+    from entity_extractor import ENTITY_PATTERNS
+
+    entities = {}
+    for entity_type, patterns in ENTITY_PATTERNS.items():
+        matches = []
+        for pattern in patterns:
+            matches.extend(re.findall(pattern, text))
+        entities[entity_type] = [item.strip() for item in set(matches) if item.strip()]
+    return entities
+
+def bench_entities(args):
+    """Check the compiled entity extractor against per-pattern findall on long reports."""
+    import pandas as pd
+    import entity_extractor
+    from entity_extractor import ENTITY_EXTRACTOR
+
+    engine = "aho-corasick" if entity_extractor.ahocorasick is not None else "regex"
+    print(f"term list engine: {engine}")
+
+    if args.data:
+        queries = pd.read_csv(args.data)['query'].astype(str).str.lower().tolist()
+        mismatches = 0
+        for query in queries:
+            want = {key: sorted(values) for key, values in _legacy_extract_entities(query).items()}
+            got = {key: sorted(values) for key, values in ENTITY_EXTRACTOR.extract(query).items()}
+            if want != got:
+                mismatches += 1
+                if mismatches <= 5:
+                    print(f"MISMATCH {query[:60]!r}")
+        assert not mismatches, f"{mismatches} of {len(queries)} queries differ"
+        print(f"{len(queries)} queries identical")
+
+    for repeat in args.repeat:
+        text = _load_document(args.file, repeat).lower()
+
+        want = {key: sorted(values) for key, values in _legacy_extract_entities(text).items()}
+        got = {key: sorted(values) for key, values in ENTITY_EXTRACTOR.extract(text).items()}
+        assert want == got, f"entities differ on {len(text)} chars"
+
+        legacy = _time_call(_legacy_extract_entities, text, args.rounds)
+        compiled = _time_call(ENTITY_EXTRACTOR.extract, text, args.rounds)
+        print(f"{len(text):>9} chars  legacy {legacy * 1000:8.2f} ms  compiled {compiled * 1000:8.2f} ms")
+
+def bench_metrics(args):
+    """Check on-device evaluation metrics against sklearn and time both."""
+    import torch
+    from sklearn.metrics import accuracy_score, precision_recall_fscore_support
+    from model import classification_metrics
+
+    def legacy(labels, preds):
+        labels, preds = labels.cpu().numpy(), preds.cpu().numpy()
+        precision, recall, f1, _ = precision_recall_fscore_support(labels, preds, average='weighted', zero_division=0)
+        return {'accuracy': accuracy_score(labels, preds), 'precision': precision, 'recall': recall, 'f1': f1}
+
+    generator = torch.Generator().manual_seed(0)
+    for size in args.sizes:
+        labels = torch.randint(0, args.num_classes, (size,), generator=generator)
+        # Mostly correct predictions, as from a trained model
+        noise = torch.randint(0, args.num_classes, (size,), generator=generator)
+        preds = torch.where(torch.rand(size, generator=generator) < 0.8, labels, noise)
+
+        want = legacy(labels, preds)
+        got = classification_metrics(labels, preds, args.num_classes)
+        diff = max(abs(want[key] - got[key]) for key in want)
+        assert diff < 1e-9, f"metrics differ by {diff} on {size} examples"
+
+        sklearn_time = _median_latency(lambda: legacy(labels, preds), args.rounds)
+        torch_time = _median_latency(lambda: classification_metrics(labels, preds, args.num_classes), args.rounds)
+        print(f"{size:>9} examples  sklearn {sklearn_time * 1000:8.2f} ms  "
+              f"torch {torch_time * 1000:8.2f} ms  max diff {diff:.1e}")
+
+def main():
+    """Parse arguments and run the selected benchmark."""
+    parser = argparse.ArgumentParser(description='Benchmark medical chatbot components')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    batching = subparsers.add_parser('batching', help='Concurrent inference with and without micro-batching')
+    batching.add_argument('--model', type=str, help='Path to a trained model')
+    batching.add_argument('--threads', type=int, default=16, help='Number of concurrent client threads')
+    batching.add_argument('--requests', type=int, default=512, help='Total number of requests')
+    batching.set_defaults(func=bench_batching)
+
+    keywords = subparsers.add_parser('keywords', help='Keyword category matching on long documents')
+    keywords.add_argument('--file', type=str, default='test_medical.txt', help='Sample document to repeat')
+    keywords.add_argument('--repeat', type=int, nargs='+', default=[1, 10, 100], help='Document repetition counts')
+    keywords.add_argument('--rounds', type=int, default=5, help='Timing rounds per measurement')
+    keywords.set_defaults(func=bench_keywords)
+
+    padding = subparsers.add_parser('padding', help='Inference latency with fixed and bucketed padding')
+    padding.add_argument('--model', type=str, help='Path to a trained model')
+    padding.add_argument('--model_name', type=str, help='Pre-trained model name or local directory to use instead')
+    padding.add_argument('--batch_sizes', type=int, nargs='+', default=[1, 8], help='Batch sizes to time')
+    padding.add_argument('--rounds', type=int, default=20, help='Timed forward passes per setting')
+    padding.set_defaults(func=bench_padding)
+
+    onnx = subparsers.add_parser('onnx', help='ONNX Runtime parity and latency against PyTorch')
+    onnx.add_argument('--model', type=str, required=True, help='Path to a saved model')
+    onnx.add_argument('--tokenizer', type=str, help='Tokenizer name or local directory (default: TOKENIZER_CONFIG)')
+    onnx.add_argument('--batch_sizes', type=int, nargs='+', default=[1, 4, 16], help='Batch sizes to check')
+    onnx.add_argument('--rounds', type=int, default=20, help='Timed runs per backend')
+    onnx.add_argument('--tolerance', type=float, default=1e-4, help='Maximum allowed absolute logit difference')
+    onnx.set_defaults(func=bench_onnx)
+
+    quantize = subparsers.add_parser('quantize', help='Weight size and latency of fp32 and int8 models')
+    quantize.add_argument('--model', type=str, required=True, help='Path to a saved model')
+    quantize.add_argument('--batch_sizes', type=int, nargs='+', default=[1, 8], help='Batch sizes to time')
+    quantize.add_argument('--seq_length', type=int, default=32, help='Sequence length of the timed inputs')
+    quantize.add_argument('--rounds', type=int, default=20, help='Timed runs per model')
+    quantize.set_defaults(func=bench_quantize)
+
+    ocr = subparsers.add_parser('ocr', help='OCR time and accuracy for each image preprocessing setting')
+    ocr.add_argument('--fixtures', type=str, default='tests/fixtures/ocr', help='Directory of images with matching .txt transcripts')
+    ocr.add_argument('--rounds', type=int, default=3, help='Timed runs per image and setting')
+    ocr.add_argument('--engine', type=str, choices=['tesserocr', 'pytesseract'], help='OCR engine (default: OCR_CONFIG)')
+    ocr.set_defaults(func=bench_ocr)
+
+    clean = subparsers.add_parser('clean', help='Text normalizer parity with NLTK and throughput')
+    clean.add_argument('--data', type=str, help='CSV with a query column (default: synthetic data)')
+    clean.add_argument('--file', type=str, default='test_medical.txt', help='Long sample document to include')
+    clean.add_argument('--repeat', type=int, default=3, help='Times the corpus is repeated')
+    clean.set_defaults(func=bench_clean)
+
+    entities = subparsers.add_parser('entities', help='Entity extraction parity and latency on long reports')
+    entities.add_argument('--data', type=str, help='CSV with a query column to check for parity')
+    entities.add_argument('--file', type=str, default='test_medical.txt', help='Sample document to repeat')
+    entities.add_argument('--repeat', type=int, nargs='+', default=[1, 10, 100], help='Document repetition counts')
+    entities.add_argument('--rounds', type=int, default=5, help='Timing rounds per measurement')
+    entities.set_defaults(func=bench_entities)
+
+    metrics = subparsers.add_parser('metrics', help='Evaluation metric parity with sklearn and latency')
+    metrics.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000], help='Numbers of examples to score')
+    metrics.add_argument('--num_classes', type=int, default=9, help='Number of classes')
+    metrics.add_argument('--rounds', type=int, default=20, help='Timed runs per implementation')
+    metrics.set_defaults(func=bench_metrics)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
@@ -22,18 +22,101 @@ TRAINING_CONFIG = {
     "batch_size": 32,  # Increased from 16 for faster training
     "learning_rate": 1e-4,  # Increased from 5e-5 for faster convergence
     "num_train_epochs": 1,  # Reduced from 3
-    "warmup_steps": 100,  # Reduced from 500
+    "warmup_steps": 100,  # Reduced from 500; counted in optimizer steps
     "weight_decay": 0.01,
-    "logging_steps": 50,  # Reduced from 100
-    "save_steps": 500,  # Reduced from 1000
-    "max_seq_length": 64  # Reduced from 128
+    "logging_steps": 50,  # Reduced from 100; optimizer steps between loss logs
+    "save_steps": 500,  # Reduced from 1000; optimizer steps between resumable checkpoints
+    "eval_steps": None,  # Optimizer steps between evaluations on a test subsample (None: full test set each epoch)
+    "eval_subsample_size": 1000,  # Test examples used by the eval_steps evaluations
+    "max_seq_length": 64,  # Reduced from 128
+    "gradient_accumulation_steps": 1,  # Batches whose gradients are summed per optimizer step
+    "precision": "fp32",  # "fp32", or "bf16" autocast with fp32 master weights where supported
+    "precision_baseline_examples": 2048,  # Training examples of the matched fp32/bf16 runs reported after bf16 training
+    "bucket_size_multiplier": 50,  # Batches per pool sorted by length; larger pools pad less but shuffle less
+    "dataloader_num_workers": 0,  # DataLoader worker processes (0 loads batches in the training process)
+    "dataloader_persistent_workers": True,  # Keep workers alive between epochs (needs num_workers > 0)
+    "dataloader_prefetch_factor": 2  # Batches loaded ahead by each worker (needs num_workers > 0)
+}
+
+# Inference configuration
+INFERENCE_CONFIG = {
+    "enable_batching": True,  # Micro-batch concurrent model predictions
+    "max_batch_size": 16,  # Flush a batch once this many requests are waiting
+    "max_wait_ms": 5,  # Or once the oldest request has waited this long
+    "request_timeout": 30,  # Seconds a caller waits for its batched prediction
+    "sync_max_length_with_training": True,  # Use TRAINING_CONFIG["max_seq_length"] at inference
+    "max_seq_length": 128,  # Inference max length when not synced with training
+    "padding_buckets": [16, 32, 64, 128],  # Batches are padded up to the nearest bucket
+    "backend": "torch",  # "torch" for eager PyTorch or "onnx" for ONNX Runtime
+    "onnx_model_path": None,  # Defaults to model.onnx inside the model bundle
+    "onnx_num_threads": None,  # ONNX Runtime intra-op threads (None lets it decide)
+    "quantize": None  # Dynamic int8 quantization: True/False, or None to follow the model bundle
+}
+
+# Response cache configuration
+CACHE_CONFIG = {
+    "enabled": True,
+    "max_entries": 4096,  # Least recently used entries are evicted beyond this
+    "ttl_seconds": 3600,  # Entries expire after this many seconds
+    "model_check_interval": 5  # Seconds between checks of the model file; a changed file is reloaded and the cache cleared
+}
+
+# Tokenizer shared by every component
+TOKENIZER_CONFIG = {
+    "name": "bert-base-uncased",
+    "local_files_only": True  # Load from the local Hugging Face cache without network access
+}
+
+# Text extraction worker pool configuration
+EXTRACTION_CONFIG = {
+    "max_workers": 2,  # OCR/parsing worker processes, sized separately from web threads
+    "max_queued": 8,  # Extraction jobs allowed to wait before uploads are rejected
+    "timeout": 60,  # Seconds before an extraction job is cancelled
+    "start_method": None,  # multiprocessing start method (None for the platform default)
+    "restart_start_method": "forkserver",  # Start method of workers replaced after a timeout ("forkserver" or "spawn")
+    "max_resubmits": 2,  # Times a job is rerun after another job's timeout restarts the pool
+    "max_in_memory_bytes": 4 * 1024 * 1024,  # Larger uploads are spooled to a temporary file
+    "spool_dir": None  # Directory for spooled uploads (None for the system temp directory)
+}
+
+# Persistent cache of uploaded document text and analyses
+DOCUMENT_CACHE_CONFIG = {
+    "enabled": True,
+    "path": "cache/documents.db",  # SQLite database keyed by the SHA-256 of each upload
+    "max_bytes": 256 * 1024 * 1024  # Least recently used documents are evicted beyond this
+}
+
+# Image preprocessing before OCR
+OCR_CONFIG = {
+    "preprocess": True,  # Set to False to OCR images exactly as uploaded
+    "target_dpi": 300,  # Images recording a higher resolution are downscaled to this
+    "max_dimension": 2500,  # Longest side in pixels (about an A4 page at 300 DPI)
+    "grayscale": True,
+    "binarize": False,  # Global Otsu thresholding; Tesseract binarizes internally, and shadows on photos turn black
+    "deskew": False,  # Straighten rotated scans (slower)
+    "max_skew_angle": 5,  # Largest skew in degrees corrected by deskew
+    "engine": "tesserocr",  # In-process Tesseract API; "pytesseract" runs the tesseract CLI per image
+    "language": "eng",
+    "tessdata_path": None,  # tesserocr traineddata directory (None for the library default)
+    "tesseract_cmd": None  # pytesseract executable (None for the platform default)
+}
+
+# PDF extraction configuration
+PDF_CONFIG = {
+    "max_pages": 200,  # Pages beyond this are ignored
+    "pages_per_job": 10,  # Pages extracted per worker job
+    "stop_after_chars": 50000  # Stop once this much text is collected (None to read all pages)
 }
 
 # Data configuration
 DATA_CONFIG = {
     "num_synthetic_samples": 1000,  # Reduced from 10000 for faster training
     "train_test_split": 0.8,
-    "seed": 42
+    "seed": 42,
+    "lemma_cache_size": 100000,  # Distinct words memoized by the text normalizer
+    "preprocess_workers": None,  # Processes cleaning and tokenizing the dataset (None for all CPUs)
+    "preprocess_shard_size": 20000,  # Texts per preprocessing shard; smaller datasets run in-process
+    "dataset_cache": True  # Reuse tokenized tensors saved by earlier runs on the same data
 }
 
 # Medical categories and conditions
@@ -61,16 +144,69 @@ COMMON_SYMPTOMS = {
     "Infectious": ["fever", "chills", "fatigue", "body aches", "swollen lymph nodes"]
 }
 
+# Rule-based keyword to category mapping for chat queries, in priority order
+KEYWORD_CATEGORIES = {
+    'heart': 'Cardiovascular',
+    'chest pain': 'Cardiovascular',
+    'blood pressure': 'Cardiovascular',
+    'palpitations': 'Cardiovascular',
+    'shortness of breath': 'Respiratory',
+    'cough': 'Respiratory',
+    'wheezing': 'Respiratory',
+    'asthma': 'Respiratory',
+    'stomach': 'Gastrointestinal',
+    'nausea': 'Gastrointestinal',
+    'vomiting': 'Gastrointestinal',
+    'diarrhea': 'Gastrointestinal',
+    'constipation': 'Gastrointestinal',
+    'headache': 'Neurological',
+    'migraine': 'Neurological',
+    'dizziness': 'Neurological',
+    'numbness': 'Neurological',
+    'joint pain': 'Musculoskeletal',
+    'muscle pain': 'Musculoskeletal',
+    'arthritis': 'Musculoskeletal',
+    'back pain': 'Musculoskeletal',
+    'rash': 'Dermatological',
+    'itching': 'Dermatological',
+    'skin': 'Dermatological',
+    'diabetes': 'Endocrine',
+    'thyroid': 'Endocrine',
+    'anxiety': 'Psychiatric',
+    'depression': 'Psychiatric',
+    'stress': 'Psychiatric',
+    'fever': 'Infectious',
+    'infection': 'Infectious',
+    'flu': 'Infectious',
+    'cold': 'Infectious'
+}
+
+# Keywords used to assign categories to extracted medical entities
+CATEGORY_KEYWORDS = {
+    'Cardiovascular': ['heart', 'chest pain', 'blood pressure', 'palpitation', 'hypertension', 'coronary', 'stroke', 'artery'],
+    'Respiratory': ['lung', 'breath', 'cough', 'asthma', 'copd', 'pneumonia', 'bronchitis', 'wheezing'],
+    'Gastrointestinal': ['stomach', 'abdomen', 'nausea', 'vomiting', 'diarrhea', 'constipation', 'gerd', 'ulcer', 'ibs'],
+    'Neurological': ['head', 'brain', 'headache', 'migraine', 'dizziness', 'seizure', 'epilepsy', 'multiple sclerosis', 'parkinson'],
+    'Musculoskeletal': ['muscle', 'bone', 'joint', 'back', 'arthritis', 'osteoporosis', 'fracture', 'sprain', 'strain'],
+    'Dermatological': ['skin', 'rash', 'itch', 'acne', 'eczema', 'psoriasis', 'dermatitis', 'hives'],
+    'Endocrine': ['diabetes', 'thyroid', 'hormone', 'insulin', 'glucose', 'hyperthyroidism', 'hypothyroidism'],
+    'Psychiatric': ['anxiety', 'depression', 'stress', 'bipolar', 'schizophrenia', 'mental', 'mood', 'panic'],
+    'Infectious': ['fever', 'infection', 'virus', 'bacterial', 'flu', 'cold', 'covid', 'pneumonia']
+}
+
 # Application configuration
 APP_CONFIG = {
     "host": "127.0.0.1",
     "port": 5000,
-    "debug": True
+    "debug": True,
+    "background_startup": True  # Load the model after the server starts; /api/ready reports progress
 }
 
 # File paths
 FILE_PATHS = {
-    "model_save_path": "models/medical_transformer.pkl",
+    "model_save_path": "models/medical_transformer",
     "synthetic_data_path": "data/synthetic_medical_data.csv",
+    "dataset_cache_dir": "data/cache",
+    "checkpoint_path": "models/checkpoints/training_checkpoint.pt",
     "logs_path": "logs/app.log"
 }
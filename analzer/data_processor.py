@@ -4,27 +4,76 @@ Data processing utilities for the medical chatbot.
 
 import pandas as pd
 import numpy as np
-import re
-import nltk
-from nltk.tokenize import word_tokenize
-from nltk.corpus import stopwords
-from nltk.stem import WordNetLemmatizer
 from sklearn.model_selection import train_test_split
 from sklearn.feature_extraction.text import TfidfVectorizer
 import torch
-from transformers import BertTokenizer
 import os
-from config import DATA_CONFIG, FILE_PATHS
-
-# Download required NLTK resources
-try:
-    nltk.data.find('tokenizers/punkt')
-    nltk.data.find('corpora/stopwords')
-    nltk.data.find('corpora/wordnet')
-except LookupError:
-    nltk.download('punkt')
-    nltk.download('stopwords')
-    nltk.download('wordnet')
+import json
+import hashlib
+import logging
+from config import DATA_CONFIG, FILE_PATHS, MEDICAL_CATEGORIES
+from keyword_matcher import ENTITY_CATEGORY_MATCHER
+from entity_extractor import ENTITY_EXTRACTOR
+from text_normalizer import TextNormalizer
+from tokenizer_registry import get_tokenizer
+from training_data import pack_sequences, select_sequences
+from concurrent.futures import ProcessPoolExecutor
+from safetensors import safe_open
+from safetensors.torch import save_file, load_file
+
+logger = logging.getLogger(__name__)
+
+# Bump when cleaning or tokenization changes so stale caches are not reused
+DATASET_CACHE_VERSION = 2
+
+def save_dataset_cache(path, train_dataset, test_dataset):
+    """
+    Save tokenized train and test datasets to a safetensors file.
+
+    Args:
+        path: Path of the cache file
+        train_dataset: Training dataset dictionary
+        test_dataset: Test dataset dictionary
+    """
+    tensors = {}
+    for split, dataset in (('train', train_dataset), ('test', test_dataset)):
+        for key, value in dataset.items():
+            if isinstance(value, torch.Tensor):
+                tensors[f"{split}.{key}"] = value.contiguous().clone()
+
+    metadata = {'category_mapping': json.dumps(train_dataset.get('category_mapping'))}
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    save_file(tensors, tmp_path, metadata=metadata)
+    os.replace(tmp_path, path)
+
+def load_dataset_cache(path):
+    """
+    Load tokenized train and test datasets saved by save_dataset_cache.
+
+    Tensors are memory-mapped from the file rather than read up front.
+
+    Args:
+        path: Path of the cache file
+
+    Returns:
+        Tuple of (train_dataset, test_dataset)
+    """
+    with safe_open(path, framework='pt') as f:
+        category_mapping = json.loads(f.metadata()['category_mapping'])
+    tensors = load_file(path)
+
+    datasets = {'train': {}, 'test': {}}
+    for name, tensor in tensors.items():
+        split, key = name.split('.', 1)
+        datasets[split][key] = tensor
+
+    for dataset in datasets.values():
+        if category_mapping is not None:
+            dataset['category_mapping'] = category_mapping
+
+    return datasets['train'], datasets['test']
 
 class MedicalDataProcessor:
     """
@@ -40,36 +89,50 @@ class MedicalDataProcessor:
             tokenizer_name: Name of the pre-trained tokenizer to use
         """
         self.max_seq_length = max_seq_length
-        self.tokenizer = BertTokenizer.from_pretrained(tokenizer_name)
-        self.lemmatizer = WordNetLemmatizer()
-        self.stop_words = set(stopwords.words('english'))
+        self.tokenizer_name = tokenizer_name
+        self.normalizer = TextNormalizer()
+
+    @property
+    def tokenizer(self):
+        """Shared fast tokenizer, loaded on first use."""
+        return get_tokenizer(self.tokenizer_name)
+
+    @property
+    def lemmatizer(self):
+        """WordNet lemmatizer used by clean_text."""
+        return self.normalizer.lemmatizer
+
+    @property
+    def stop_words(self):
+        """Stopwords removed by clean_text."""
+        return self.normalizer.stop_words
 
     def clean_text(self, text):
         """
         Clean and normalize text data.
 
+        Lowercases the text, removes special characters and numbers, then drops
+        stopwords and lemmatizes the remaining tokens.
+
         Args:
             text: Input text to clean
 
         Returns:
             Cleaned text
         """
-        # Convert to lowercase
-        text = text.lower()
-
-        # Remove special characters and numbers
-        text = re.sub(r'[^a-zA-Z\s]', '', text)
-
-        # Tokenize
-        tokens = word_tokenize(text)
+        return self.normalizer.normalize(text)
 
-        # Remove stopwords and lemmatize
-        cleaned_tokens = [self.lemmatizer.lemmatize(token) for token in tokens if token not in self.stop_words]
+    def clean_texts(self, texts):
+        """
+        Clean and normalize a batch of texts.
 
-        # Join tokens back into text
-        cleaned_text = ' '.join(cleaned_tokens)
+        Args:
+            texts: List or pandas Series of input texts
 
-        return cleaned_text
+        Returns:
+            Cleaned texts, as a Series with the same index if a Series was given
+        """
+        return self.normalizer.normalize_batch(texts)
 
     def tokenize_text(self, text):
         """
@@ -89,7 +152,77 @@ class MedicalDataProcessor:
             return_tensors='pt'
         )
 
-    def prepare_dataset(self, data_path=None, test_size=0.2, random_state=42):
+    def tokenize_sequences(self, texts):
+        """
+        Tokenize texts without padding, packed into flat tensors.
+
+        Sequences are truncated to max_seq_length; padding is left to the
+        training collator, which pads each batch to its longest sequence.
+
+        Args:
+            texts: List of texts to tokenize
+
+        Returns:
+            Dictionary of token_ids (all sequences concatenated) and lengths
+        """
+        encodings = self.tokenizer(
+            list(texts),
+            truncation=True,
+            max_length=self.max_seq_length
+        )
+        token_ids, lengths = pack_sequences(encodings['input_ids'])
+        return {'token_ids': token_ids, 'lengths': lengths}
+
+    def clean_and_tokenize(self, texts):
+        """
+        Clean a batch of texts and tokenize them to unpadded sequences.
+
+        Args:
+            texts: List of input texts
+
+        Returns:
+            Tuple of (cleaned texts, dictionary of packed token_ids and lengths)
+        """
+        cleaned = self.clean_texts(list(texts))
+        return cleaned, self.tokenize_sequences(cleaned)
+
+    def preprocess_corpus(self, texts, num_workers=None, shard_size=None):
+        """
+        Clean and tokenize a corpus, in parallel shards if it is large.
+
+        Shards are contiguous and results are concatenated in shard order, so
+        the output is identical to processing the corpus in one piece.
+
+        Args:
+            texts: List of input texts
+            num_workers: Worker processes to use (defaults to DATA_CONFIG)
+            shard_size: Texts per shard (defaults to DATA_CONFIG)
+
+        Returns:
+            Tuple of (cleaned texts, dictionary of packed token_ids and lengths)
+        """
+        num_workers = num_workers or DATA_CONFIG["preprocess_workers"] or os.cpu_count()
+        shard_size = shard_size or DATA_CONFIG["preprocess_shard_size"]
+
+        if num_workers <= 1 or len(texts) <= shard_size:
+            return self.clean_and_tokenize(texts)
+
+        shards = [texts[start:start + shard_size] for start in range(0, len(texts), shard_size)]
+        with ProcessPoolExecutor(
+            max_workers=min(num_workers, len(shards)),
+            initializer=_init_preprocess_worker,
+            initargs=(self.max_seq_length, self.tokenizer_name)
+        ) as executor:
+            results = list(executor.map(_preprocess_shard, shards))
+
+        cleaned = [text for shard_cleaned, _ in results for text in shard_cleaned]
+        encodings = {
+            key: torch.cat([shard_encodings[key] for _, shard_encodings in results])
+            for key in ('token_ids', 'lengths')
+        }
+        return cleaned, encodings
+
+    def prepare_dataset(self, data_path=None, test_size=0.2, random_state=42, num_workers=None, use_cache=None):
         """
         Prepare dataset for model training.
 
@@ -97,69 +230,133 @@ class MedicalDataProcessor:
             data_path: Path to the dataset CSV file
             test_size: Proportion of data to use for testing
             random_state: Random seed for reproducibility
+            num_workers: Worker processes for cleaning and tokenization (defaults to DATA_CONFIG)
+            use_cache: Load and save the tokenized tensors on disk (defaults to DATA_CONFIG)
 
         Returns:
-            Tuple of (train_dataset, test_dataset)
+            Tuple of (train_dataset, test_dataset); each also holds the row
+            indices of its split in the data file
         """
         if data_path is None:
             data_path = FILE_PATHS["synthetic_data_path"]
+        if use_cache is None:
+            use_cache = DATA_CONFIG["dataset_cache"]
+
+        # Reuse the tensors of an earlier run on the same data and settings
+        cache_path = None
+        if use_cache:
+            cache_path = self.dataset_cache_path(data_path, test_size, random_state)
+            if os.path.exists(cache_path):
+                logger.info(f"Loading tokenized dataset from cache {cache_path}")
+                return load_dataset_cache(cache_path)
 
         # Load data
         df = pd.read_csv(data_path)
 
-        # Clean text
-        df['cleaned_query'] = df['query'].apply(self.clean_text)
+        # Clean and tokenize every query once, before splitting
+        df['cleaned_query'], encodings = self.preprocess_corpus(df['query'].tolist(), num_workers=num_workers)
 
         # Split into train and test sets
-        train_df, test_df = train_test_split(
-            df,
+        train_idx, test_idx = train_test_split(
+            np.arange(len(df)),
             test_size=test_size,
             random_state=random_state,
             stratify=df['category'] if 'category' in df.columns else None
         )
 
+        # Use one label mapping for both splits, following MEDICAL_CATEGORIES order
+        category_to_idx = None
+        if 'category' in df.columns:
+            categories = [c for c in MEDICAL_CATEGORIES if c in set(df['category'])]
+            categories += sorted(set(df['category']) - set(categories))
+            category_to_idx = {category: idx for idx, category in enumerate(categories)}
+
         # Create PyTorch datasets
-        train_dataset = self.create_torch_dataset(train_df)
-        test_dataset = self.create_torch_dataset(test_df)
+        datasets = []
+        for split_idx in (train_idx, test_idx):
+            token_ids, lengths = select_sequences(encodings['token_ids'], encodings['lengths'], split_idx)
+            datasets.append(self.create_torch_dataset(
+                df.iloc[split_idx], category_to_idx,
+                encodings={'token_ids': token_ids, 'lengths': lengths}
+            ))
+        train_dataset, test_dataset = datasets
+        train_dataset['indices'] = torch.from_numpy(train_idx)
+        test_dataset['indices'] = torch.from_numpy(test_idx)
+
+        if cache_path:
+            save_dataset_cache(cache_path, train_dataset, test_dataset)
+            logger.info(f"Tokenized dataset cached at {cache_path}")
 
         return train_dataset, test_dataset
 
-    def create_torch_dataset(self, df):
+    def dataset_cache_path(self, data_path, test_size, random_state):
+        """
+        Return the cache file for a dataset prepared with the given settings.
+
+        The file name is a hash of the data file contents, the tokenizer name,
+        max_seq_length, the split settings and the cache format version.
+
+        Args:
+            data_path: Path to the dataset CSV file
+            test_size: Proportion of data to use for testing
+            random_state: Random seed of the split
+
+        Returns:
+            Path of the cache file
+        """
+        digest = hashlib.sha256()
+        with open(data_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+
+        key = json.dumps({
+            'data': digest.hexdigest(),
+            'tokenizer': self.tokenizer_name,
+            'max_seq_length': self.max_seq_length,
+            'test_size': test_size,
+            'random_state': random_state,
+            'version': DATASET_CACHE_VERSION
+        }, sort_keys=True)
+        cache_key = hashlib.sha256(key.encode('utf-8')).hexdigest()[:32]
+
+        return os.path.join(FILE_PATHS["dataset_cache_dir"], f"dataset-{cache_key}.safetensors")
+
+    def create_torch_dataset(self, df, category_to_idx=None, encodings=None):
         """
         Create a PyTorch dataset from a DataFrame.
 
         Args:
             df: Input DataFrame
+            category_to_idx: Optional mapping of category name to label index;
+                built from the categories in df if not given
+            encodings: Optional packed token_ids and lengths already computed
+                for the rows of df
 
         Returns:
-            Dictionary containing tokenized inputs and labels
+            Dictionary containing unpadded tokenized inputs and labels
         """
         # Tokenize queries
-        encodings = self.tokenizer(
-            df['cleaned_query'].tolist(),
-            padding='max_length',
-            truncation=True,
-            max_length=self.max_seq_length,
-            return_tensors='pt'
-        )
+        if encodings is None:
+            encodings = self.tokenize_sequences(df['cleaned_query'].tolist())
 
         # Create category labels if available
         if 'category' in df.columns:
             # Create a mapping of categories to indices
-            categories = df['category'].unique()
-            category_to_idx = {category: idx for idx, category in enumerate(categories)}
+            if category_to_idx is None:
+                categories = df['category'].unique()
+                category_to_idx = {category: idx for idx, category in enumerate(categories)}
             labels = torch.tensor([category_to_idx[category] for category in df['category']])
 
             dataset = {
-                'input_ids': encodings['input_ids'],
-                'attention_mask': encodings['attention_mask'],
+                'token_ids': encodings['token_ids'],
+                'lengths': encodings['lengths'],
                 'labels': labels,
                 'category_mapping': category_to_idx
             }
         else:
             dataset = {
-                'input_ids': encodings['input_ids'],
-                'attention_mask': encodings['attention_mask']
+                'token_ids': encodings['token_ids'],
+                'lengths': encodings['lengths']
             }
 
         return dataset
@@ -190,157 +387,29 @@ class MedicalDataProcessor:
         Returns:
             Dictionary of extracted entities
         """
-        from config import MEDICAL_CATEGORIES, COMMON_SYMPTOMS
-
-        entities = {
-            'symptoms': [],
-            'conditions': [],
-            'medications': [],
-            'body_parts': [],
-            'medical_values': [],
-            'categories': []
-        }
-
-        # Comprehensive symptom patterns
-        symptom_patterns = [
-            # Pain patterns
-            r'pain in (?:my |the )?([\w\s]+)',
-            r'([\w\s]+) (?:pain|ache|hurts)',
-            r'(sharp|dull|throbbing|constant|intermittent|severe|mild|moderate) pain',
-            # Common symptoms
-            r'(headache|migraine|fever|cough|nausea|vomiting|diarrhea|constipation|dizziness|fatigue|weakness|numbness|tingling|swelling|rash|itching|burning|bleeding|bruising|shortness of breath|difficulty breathing|chest pain|palpitations|irregular heartbeat|loss of appetite|weight loss|weight gain|insomnia|excessive sleepiness|anxiety|depression|stress|confusion|memory loss)',
-            # Feeling patterns
-            r'feeling (tired|dizzy|nauseous|weak|faint|lightheaded|confused|depressed|anxious|stressed|exhausted|fatigued|sick|ill|unwell)'
-        ]
-
-        # Comprehensive condition patterns
-        condition_patterns = [
-            # Common conditions
-            r'(diabetes|hypertension|high blood pressure|asthma|copd|arthritis|osteoporosis|depression|anxiety|bipolar disorder|schizophrenia|alzheimer\'s|dementia|cancer|heart disease|coronary artery disease|heart failure|stroke|kidney disease|liver disease|hepatitis|cirrhosis|ulcer|gerd|ibs|crohn\'s disease|ulcerative colitis|multiple sclerosis|parkinson\'s disease|epilepsy|seizure disorder|thyroid disease|hypothyroidism|hyperthyroidism)',
-            # Diagnosis patterns
-            r'diagnosed with ([\w\s]+)',
-            r'I have ([\w\s]+) (?:disease|disorder|condition|syndrome)',
-            r'suffering from ([\w\s]+)',
-            r'dealing with ([\w\s]+)'
-        ]
-
-        # Comprehensive medication patterns
-        medication_patterns = [
-            r'taking ([\w\s]+)',
-            r'prescribed ([\w\s]+)',
-            r'medication(?:s)? (?:called|named) ([\w\s]+)',
-            r'(?:on|using) ([\w\s]+) for',
-            r'(aspirin|tylenol|advil|ibuprofen|acetaminophen|lisinopril|metformin|atorvastatin|levothyroxine|albuterol|fluticasone|omeprazole|losartan|metoprolol|amlodipine|gabapentin|hydrochlorothiazide|sertraline|fluoxetine|escitalopram|citalopram|amoxicillin|azithromycin|prednisone|insulin)'
-        ]
-
-        # Comprehensive body part patterns
-        body_part_patterns = [
-            r'(head|brain|skull|face|eye|eyes|ear|ears|nose|mouth|throat|neck|shoulder|shoulders|arm|arms|elbow|elbows|wrist|wrists|hand|hands|finger|fingers|chest|breast|breasts|heart|lung|lungs|abdomen|stomach|liver|kidney|kidneys|intestine|intestines|colon|bladder|back|spine|hip|hips|leg|legs|knee|knees|ankle|ankles|foot|feet|toe|toes|skin|muscle|muscles|bone|bones|joint|joints|tendon|tendons|ligament|ligaments)'
-        ]
-
-        # Medical values patterns
-        medical_value_patterns = [
-            r'blood pressure (?:of |is |was )?([\d/]+)',
-            r'heart rate (?:of |is |was )?([\d]+)',
-            r'temperature (?:of |is |was )?([\d\.]+)',
-            r'glucose (?:level |of |is |was )?([\d\.]+)',
-            r'cholesterol (?:level |of |is |was )?([\d\.]+)',
-            r'([\d\.]+)\s*(?:mg|kg|lb|cm|mm|in|ft|°C|°F|bpm|mmHg)'
-        ]
-
         # Process text to handle common variations
         processed_text = text.lower()
 
-        # Extract symptoms
-        for pattern in symptom_patterns:
-            matches = re.findall(pattern, processed_text)
-            if matches:
-                # Handle tuple results from groups
-                for match in matches:
-                    if isinstance(match, tuple):
-                        entities['symptoms'].extend(list(match))
-                    else:
-                        entities['symptoms'].append(match)
-
-        # Extract conditions
-        for pattern in condition_patterns:
-            matches = re.findall(pattern, processed_text)
-            if matches:
-                # Handle tuple results from groups
-                for match in matches:
-                    if isinstance(match, tuple):
-                        entities['conditions'].extend(list(match))
-                    else:
-                        entities['conditions'].append(match)
-
-        # Extract medications
-        for pattern in medication_patterns:
-            matches = re.findall(pattern, processed_text)
-            if matches:
-                # Handle tuple results from groups
-                for match in matches:
-                    if isinstance(match, tuple):
-                        entities['medications'].extend(list(match))
-                    else:
-                        entities['medications'].append(match)
-
-        # Extract body parts
-        for pattern in body_part_patterns:
-            matches = re.findall(pattern, processed_text)
-            if matches:
-                # Handle tuple results from groups
-                for match in matches:
-                    if isinstance(match, tuple):
-                        entities['body_parts'].extend(list(match))
-                    else:
-                        entities['body_parts'].append(match)
-
-        # Extract medical values
-        for pattern in medical_value_patterns:
-            matches = re.findall(pattern, processed_text)
-            if matches:
-                entities['medical_values'].extend(matches)
-
-        # Clean and normalize entities
-        for key in entities:
-            # Remove duplicates
-            entities[key] = list(set(entities[key]))
-            # Clean up strings
-            entities[key] = [item.strip() for item in entities[key] if item.strip()]
-
-        # Determine medical categories based on symptoms and conditions
-        category_keywords = {
-            'Cardiovascular': ['heart', 'chest pain', 'blood pressure', 'palpitation', 'hypertension', 'coronary', 'stroke', 'artery'],
-            'Respiratory': ['lung', 'breath', 'cough', 'asthma', 'copd', 'pneumonia', 'bronchitis', 'wheezing'],
-            'Gastrointestinal': ['stomach', 'abdomen', 'nausea', 'vomiting', 'diarrhea', 'constipation', 'gerd', 'ulcer', 'ibs'],
-            'Neurological': ['head', 'brain', 'headache', 'migraine', 'dizziness', 'seizure', 'epilepsy', 'multiple sclerosis', 'parkinson'],
-            'Musculoskeletal': ['muscle', 'bone', 'joint', 'back', 'arthritis', 'osteoporosis', 'fracture', 'sprain', 'strain'],
-            'Dermatological': ['skin', 'rash', 'itch', 'acne', 'eczema', 'psoriasis', 'dermatitis', 'hives'],
-            'Endocrine': ['diabetes', 'thyroid', 'hormone', 'insulin', 'glucose', 'hyperthyroidism', 'hypothyroidism'],
-            'Psychiatric': ['anxiety', 'depression', 'stress', 'bipolar', 'schizophrenia', 'mental', 'mood', 'panic'],
-            'Infectious': ['fever', 'infection', 'virus', 'bacterial', 'flu', 'cold', 'covid', 'pneumonia']
-        }
+        # Patterns are compiled once per process in the shared extractor
+        entities = ENTITY_EXTRACTOR.extract(processed_text)
 
-        # Check all extracted entities against category keywords
+        # Determine medical categories based on symptoms, conditions and the text itself
         all_extracted_terms = ' '.join([' '.join(entities['symptoms']), ' '.join(entities['conditions']), processed_text])
+        entities['categories'] = list(ENTITY_CATEGORY_MATCHER.labels(all_extracted_terms))
 
-        for category, keywords in category_keywords.items():
-            for keyword in keywords:
-                if keyword in all_extracted_terms:
-                    entities['categories'].append(category)
-                    break
+        return entities
 
-        # Also check against common symptoms from config
-        for category, symptoms in COMMON_SYMPTOMS.items():
-            for symptom in symptoms:
-                if symptom in all_extracted_terms and category not in entities['categories']:
-                    entities['categories'].append(category)
-                    break
+# Processor of each preprocessing worker process
+_worker_processor = None
 
-        # Remove duplicates in categories
-        entities['categories'] = list(set(entities['categories']))
+def _init_preprocess_worker(max_seq_length, tokenizer_name):
+    """Create the processor used by a preprocessing worker."""
+    global _worker_processor
+    _worker_processor = MedicalDataProcessor(max_seq_length=max_seq_length, tokenizer_name=tokenizer_name)
 
-        return entities
+def _preprocess_shard(texts):
+    """Clean and tokenize one shard of texts in a worker process."""
+    return _worker_processor.clean_and_tokenize(texts)
 
 if __name__ == "__main__":
     # Test the data processor
@@ -359,5 +428,5 @@ if __name__ == "__main__":
     # Test dataset preparation if data file exists
     if os.path.exists(FILE_PATHS["synthetic_data_path"]):
         train_dataset, test_dataset = processor.prepare_dataset()
-        print(f"Train dataset size: {len(train_dataset['input_ids'])}")
-        print(f"Test dataset size: {len(test_dataset['input_ids'])}")
+        print(f"Train dataset size: {len(train_dataset['lengths'])}")
+        print(f"Test dataset size: {len(test_dataset['lengths'])}")
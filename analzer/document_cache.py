@@ -0,0 +1,185 @@
+"""
+Persistent content-addressed cache of extracted upload text and analyses.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+def content_digest(source, chunk_size=1024 * 1024):
+    """
+    Compute the SHA-256 digest of an upload.
+
+    Args:
+        source: Upload contents as bytes, or a file path
+        chunk_size: Bytes read at a time from a file
+
+    Returns:
+        Hex digest
+    """
+    if isinstance(source, (bytes, bytearray)):
+        return hashlib.sha256(source).hexdigest()
+
+    digest = hashlib.sha256()
+    with open(source, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class DocumentCache:
+    """
+    SQLite store of extracted text and analyses keyed by upload content.
+
+    Entries are keyed by the SHA-256 digest of the uploaded bytes and the file
+    type, so re-uploads of the same document skip extraction. The analysis is
+    stored with the version of the model that produced it and is only reused
+    for that version. Once the stored text and analyses exceed max_bytes the
+    least recently used entries are evicted.
+    """
+
+    def __init__(self, path, max_bytes=256 * 1024 * 1024):
+        """
+        Open or create the cache database.
+
+        Args:
+            path: Path of the SQLite database file
+            max_bytes: Maximum total size of stored entries
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS documents (
+                digest TEXT NOT NULL,
+                file_type TEXT NOT NULL,
+                pages TEXT NOT NULL,
+                model_version TEXT,
+                analysis TEXT,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (digest, file_type)
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS documents_last_access ON documents (last_access)")
+        self._conn.commit()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, digest, file_type):
+        """
+        Look up a document.
+
+        Args:
+            digest: Content digest of the upload
+            file_type: Upload file extension
+
+        Returns:
+            Dictionary with pages, model_version and analysis, or None if missing
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT pages, model_version, analysis FROM documents WHERE digest = ? AND file_type = ?",
+                (digest, file_type)
+            ).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            self._conn.execute(
+                "UPDATE documents SET last_access = ? WHERE digest = ? AND file_type = ?",
+                (time.time(), digest, file_type)
+            )
+            self._conn.commit()
+            self.hits += 1
+
+        pages, model_version, analysis = row
+        return {
+            'pages': json.loads(pages),
+            'model_version': model_version,
+            'analysis': json.loads(analysis) if analysis is not None else None
+        }
+
+    def put(self, digest, file_type, pages, model_version=None, analysis=None):
+        """
+        Store a document, evicting least recently used entries if over size.
+
+        Args:
+            digest: Content digest of the upload
+            file_type: Upload file extension
+            pages: List of extracted text chunks
+            model_version: Version of the model that produced the analysis
+            analysis: JSON-serializable analysis result
+        """
+        pages_json = json.dumps(pages)
+        analysis_json = json.dumps(analysis) if analysis is not None else None
+        size = len(pages_json.encode('utf-8')) + len((analysis_json or '').encode('utf-8'))
+
+        if size > self.max_bytes:
+            logger.info(f"Document {digest[:12]} too large to cache ({size} bytes)")
+            return
+
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO documents VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (digest, file_type, pages_json, model_version, analysis_json, size, time.time())
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """Delete least recently used entries until the total size fits."""
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM documents").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        evicted = []
+        for digest, file_type, size in self._conn.execute(
+            "SELECT digest, file_type, size FROM documents ORDER BY last_access"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            evicted.append((digest, file_type))
+            total -= size
+
+        self._conn.executemany("DELETE FROM documents WHERE digest = ? AND file_type = ?", evicted)
+        self.evictions += len(evicted)
+
+    def clear(self):
+        """Remove all entries."""
+        with self._lock:
+            self._conn.execute("DELETE FROM documents")
+            self._conn.commit()
+
+    def stats(self):
+        """Return the cache size and hit/miss/eviction counters."""
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM documents"
+            ).fetchone()
+            lookups = self.hits + self.misses
+            return {
+                'entries': entries,
+                'size_bytes': size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
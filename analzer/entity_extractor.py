@@ -0,0 +1,194 @@
+"""
+Medical entity extraction compiled once per process.
+"""
+
+import re
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+# Entity patterns by entity type, applied to lowercased text. Each pattern
+# contributes what re.findall returns for it.
+ENTITY_PATTERNS = {
+    'symptoms': [
+        # Pain patterns
+        r'pain in (?:my |the )?([\w\s]+)',
+        r'([\w\s]+) (?:pain|ache|hurts)',
+        r'(sharp|dull|throbbing|constant|intermittent|severe|mild|moderate) pain',
+        # Common symptoms
+        r'(headache|migraine|fever|cough|nausea|vomiting|diarrhea|constipation|dizziness|fatigue|weakness|numbness|tingling|swelling|rash|itching|burning|bleeding|bruising|shortness of breath|difficulty breathing|chest pain|palpitations|irregular heartbeat|loss of appetite|weight loss|weight gain|insomnia|excessive sleepiness|anxiety|depression|stress|confusion|memory loss)',
+        # Feeling patterns
+        r'feeling (tired|dizzy|nauseous|weak|faint|lightheaded|confused|depressed|anxious|stressed|exhausted|fatigued|sick|ill|unwell)'
+    ],
+    'conditions': [
+        # Common conditions
+        r'(diabetes|hypertension|high blood pressure|asthma|copd|arthritis|osteoporosis|depression|anxiety|bipolar disorder|schizophrenia|alzheimer\'s|dementia|cancer|heart disease|coronary artery disease|heart failure|stroke|kidney disease|liver disease|hepatitis|cirrhosis|ulcer|gerd|ibs|crohn\'s disease|ulcerative colitis|multiple sclerosis|parkinson\'s disease|epilepsy|seizure disorder|thyroid disease|hypothyroidism|hyperthyroidism)',
+        # Diagnosis patterns
+        r'diagnosed with ([\w\s]+)',
+        r'I have ([\w\s]+) (?:disease|disorder|condition|syndrome)',
+        r'suffering from ([\w\s]+)',
+        r'dealing with ([\w\s]+)'
+    ],
+    'medications': [
+        r'taking ([\w\s]+)',
+        r'prescribed ([\w\s]+)',
+        r'medication(?:s)? (?:called|named) ([\w\s]+)',
+        r'(?:on|using) ([\w\s]+) for',
+        r'(aspirin|tylenol|advil|ibuprofen|acetaminophen|lisinopril|metformin|atorvastatin|levothyroxine|albuterol|fluticasone|omeprazole|losartan|metoprolol|amlodipine|gabapentin|hydrochlorothiazide|sertraline|fluoxetine|escitalopram|citalopram|amoxicillin|azithromycin|prednisone|insulin)'
+    ],
+    'body_parts': [
+        r'(head|brain|skull|face|eye|eyes|ear|ears|nose|mouth|throat|neck|shoulder|shoulders|arm|arms|elbow|elbows|wrist|wrists|hand|hands|finger|fingers|chest|breast|breasts|heart|lung|lungs|abdomen|stomach|liver|kidney|kidneys|intestine|intestines|colon|bladder|back|spine|hip|hips|leg|legs|knee|knees|ankle|ankles|foot|feet|toe|toes|skin|muscle|muscles|bone|bones|joint|joints|tendon|tendons|ligament|ligaments)'
+    ],
+    'medical_values': [
+        r'blood pressure (?:of |is |was )?([\d/]+)',
+        r'heart rate (?:of |is |was )?([\d]+)',
+        r'temperature (?:of |is |was )?([\d\.]+)',
+        r'glucose (?:level |of |is |was )?([\d\.]+)',
+        r'cholesterol (?:level |of |is |was )?([\d\.]+)',
+        r'([\d\.]+)\s*(?:mg|kg|lb|cm|mm|in|ft|°C|°F|bpm|mmHg)'
+    ]
+}
+
+# A group of literal terms, e.g. (fever|cough|chest pain)
+_TERM_LIST = re.compile(r"\(((?:[a-z ]|\\')+(?:\|(?:[a-z ]|\\')+)*)\)")
+
+# A word/space phrase ending in one of several words, e.g. ([\w\s]+) (?:pain|ache)
+_TRAILING_WORD_PHRASE = re.compile(r"\(\[\\w\\s\]\+\) \(\?:([a-z]+(?:\|[a-z]+)*)\)")
+
+# Characters ending a run of the characters matched by [\w\s]+
+_RUN_BOUNDARY = re.compile(r'[^\w\s]')
+
+class EntityExtractor:
+    """
+    Extracts medical entities with the patterns in ENTITY_PATTERNS.
+
+    Results are identical to running re.findall for every pattern, but the
+    work per document is reduced:
+
+    - Patterns that are lists of literal terms are matched together in one
+      Aho-Corasick pass (when pyahocorasick is installed); the regex rule of
+      leftmost, first-listed, non-overlapping matches is then applied to the
+      term occurrences of each list.
+    - Phrases of the form ([\\w\\s]+) (?:word|...) are found from the
+      occurrences of their trailing words, scanning each word/space run at
+      most once, instead of the quadratic backtracking the regex engine does
+      on long runs.
+    - All other patterns are compiled once.
+    """
+
+    def __init__(self, patterns=None):
+        """
+        Compile the patterns.
+
+        Args:
+            patterns: Mapping of entity type to regex patterns (defaults to ENTITY_PATTERNS)
+        """
+        self.patterns = patterns or ENTITY_PATTERNS
+
+        self._regexes = []       # (entity type, compiled pattern)
+        self._phrases = []       # (entity type, compiled trailing words)
+        self._term_lists = []    # (entity type, terms in priority order)
+
+        for entity_type, type_patterns in self.patterns.items():
+            for pattern in type_patterns:
+                term_list = _TERM_LIST.fullmatch(pattern)
+                phrase = _TRAILING_WORD_PHRASE.fullmatch(pattern)
+                if term_list:
+                    terms = term_list.group(1).replace("\\'", "'").split('|')
+                    self._term_lists.append((entity_type, terms))
+                elif phrase:
+                    trailing_words = re.compile(' (?:' + phrase.group(1) + ')')
+                    self._phrases.append((entity_type, trailing_words))
+                else:
+                    self._regexes.append((entity_type, re.compile(pattern)))
+
+        self._automaton = None
+        if ahocorasick is not None:
+            # Each term maps to the lists containing it and its position there
+            memberships = {}
+            for list_id, (_, terms) in enumerate(self._term_lists):
+                for priority, term in enumerate(terms):
+                    memberships.setdefault(term, []).append((list_id, priority))
+
+            self._automaton = ahocorasick.Automaton()
+            for term, term_memberships in memberships.items():
+                self._automaton.add_word(term, (term, term_memberships))
+            self._automaton.make_automaton()
+        else:
+            self._regexes.extend(
+                (entity_type, re.compile('(' + '|'.join(re.escape(term) for term in terms) + ')'))
+                for entity_type, terms in self._term_lists
+            )
+
+    def _find_terms(self, text, found):
+        """Add the matches of every literal term list to found."""
+        occurrences = [[] for _ in self._term_lists]
+        for end, (term, term_memberships) in self._automaton.iter(text):
+            start = end - len(term) + 1
+            for list_id, priority in term_memberships:
+                occurrences[list_id].append((start, priority, term))
+
+        for (entity_type, _), list_occurrences in zip(self._term_lists, occurrences):
+            # At each position the first-listed term wins, then the scan
+            # resumes after it, as in re.findall
+            list_occurrences.sort()
+            next_start = 0
+            for start, _, term in list_occurrences:
+                if start >= next_start:
+                    found[entity_type].append(term)
+                    next_start = start + len(term)
+
+    def _find_phrases(self, text, found):
+        """Add the matches of every trailing-word phrase pattern to found."""
+        reversed_text = None
+        for entity_type, trailing_words in self._phrases:
+            hits = [hit.start() for hit in trailing_words.finditer(text)]
+            if not hits:
+                continue
+            if reversed_text is None:
+                reversed_text = text[::-1]
+
+            # Greedy [\w\s]+ backtracks to the last trailing word of a
+            # word/space run, which leaves no room for a second match in that
+            # run; so take the last hit of each run, walking runs backwards
+            matches = []
+            i = len(hits) - 1
+            while i >= 0:
+                end = hits[i]
+                boundary = _RUN_BOUNDARY.search(reversed_text, len(text) - end)
+                start = len(text) - boundary.start() if boundary else 0
+                if end > start:
+                    matches.append(text[start:end])
+                while i >= 0 and hits[i] >= start:
+                    i -= 1
+            found[entity_type].extend(reversed(matches))
+
+    def extract(self, text):
+        """
+        Extract entities from a lowercased text.
+
+        Args:
+            text: Lowercased input text
+
+        Returns:
+            Dictionary of entity type to distinct, stripped matches in first-seen order
+        """
+        found = {entity_type: [] for entity_type in self.patterns}
+
+        for entity_type, regex in self._regexes:
+            found[entity_type].extend(regex.findall(text))
+        if self._phrases:
+            self._find_phrases(text, found)
+        if self._automaton is not None:
+            self._find_terms(text, found)
+
+        # Remove duplicates and surrounding whitespace
+        return {
+            entity_type: [item.strip() for item in dict.fromkeys(matches) if item.strip()]
+            for entity_type, matches in found.items()
+        }
+
+# Shared extractor compiled once per process
+ENTITY_EXTRACTOR = EntityExtractor()
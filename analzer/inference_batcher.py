@@ -0,0 +1,110 @@
+"""
+Micro-batching scheduler for concurrent model inference requests.
+"""
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+# Sentinel placed on the queue to stop the worker thread
+_STOP = object()
+
+class InferenceBatcher:
+    """
+    Collects concurrent inference requests and runs them as one batch.
+
+    Requests submitted from any number of threads are queued and handed to
+    ``batch_fn`` together once ``max_batch_size`` requests are waiting or the
+    oldest request has waited ``max_wait_ms``. Each caller receives a future
+    that resolves to its own entry of the batch result.
+    """
+
+    def __init__(self, batch_fn, max_batch_size=16, max_wait_ms=5):
+        """
+        Initialize the batcher and start its worker thread.
+
+        Args:
+            batch_fn: Callable taking a list of items and returning a list of
+                results in the same order
+            max_batch_size: Maximum number of items per batch
+            max_wait_ms: Maximum time in milliseconds to wait for a batch to fill
+        """
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms / 1000.0)
+
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name="inference-batcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, item):
+        """
+        Queue an item for batched processing.
+
+        Args:
+            item: Input passed to ``batch_fn`` as part of a batch
+
+        Returns:
+            Future resolving to the result for this item
+        """
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def close(self):
+        """Stop the worker thread after the queued requests are processed."""
+        self._queue.put(_STOP)
+        self._worker.join()
+
+    def _collect_batch(self):
+        """Block until a batch is ready and return it, or None on shutdown."""
+        entry = self._queue.get()
+        if entry is _STOP:
+            return None
+
+        batch = [entry]
+        deadline = time.monotonic() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                entry = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+
+            if entry is _STOP:
+                # Process what we have, then let the next iteration shut down
+                self._queue.put(_STOP)
+                break
+
+            batch.append(entry)
+
+        return batch
+
+    def _run(self):
+        """Worker loop that drains the queue batch by batch."""
+        while True:
+            batch = self._collect_batch()
+            if batch is None:
+                break
+
+            # Drop requests whose callers have already given up
+            batch = [(item, future) for item, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            items = [item for item, _ in batch]
+            try:
+                results = self.batch_fn(items)
+            except Exception as e:
+                logger.error(f"Error in batched inference: {e}")
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
@@ -0,0 +1,115 @@
+"""
+Multi-pattern keyword matching for rule-based category detection.
+"""
+
+from config import KEYWORD_CATEGORIES, CATEGORY_KEYWORDS, COMMON_SYMPTOMS
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+class KeywordMatcher:
+    """
+    Finds every occurrence of a fixed set of keywords in a single pass.
+
+    Keywords are matched as plain substrings, exactly like ``keyword in text``.
+    The matcher is compiled once from a list of (keyword, label) entries whose
+    order defines their priority; the same keyword may carry several labels.
+    An Aho-Corasick automaton is used when pyahocorasick is installed,
+    otherwise each distinct keyword is checked once.
+    """
+
+    def __init__(self, entries):
+        """
+        Compile the matcher.
+
+        Args:
+            entries: Iterable of (keyword, label) pairs in priority order
+        """
+        self.entries = [(keyword.lower(), label) for keyword, label in entries]
+
+        # Map each distinct keyword to the priorities of the entries using it
+        self._keyword_entries = {}
+        for priority, (keyword, _) in enumerate(self.entries):
+            self._keyword_entries.setdefault(keyword, []).append(priority)
+
+        keywords = list(self._keyword_entries)
+
+        if ahocorasick is not None:
+            self._automaton = ahocorasick.Automaton()
+            for keyword in keywords:
+                self._automaton.add_word(keyword, keyword)
+            self._automaton.make_automaton()
+        else:
+            # Substring search runs in C, which beats a pure-Python automaton
+            self._automaton = None
+            self._keywords = keywords
+
+    def find_keywords(self, text):
+        """
+        Find the distinct keywords occurring in a text.
+
+        Args:
+            text: Lowercased input text
+
+        Returns:
+            Set of matched keywords
+        """
+        if self._automaton is not None:
+            return {keyword for _, keyword in self._automaton.iter(text)}
+
+        return {keyword for keyword in self._keywords if keyword in text}
+
+    def matches(self, text):
+        """
+        Find the entries whose keyword occurs in a text.
+
+        Args:
+            text: Lowercased input text
+
+        Returns:
+            List of matched (keyword, label) entries in priority order
+        """
+        priorities = sorted(
+            priority
+            for keyword in self.find_keywords(text)
+            for priority in self._keyword_entries[keyword]
+        )
+        return [self.entries[priority] for priority in priorities]
+
+    def first_label(self, text):
+        """
+        Return the label of the highest-priority keyword in a text.
+
+        Args:
+            text: Lowercased input text
+
+        Returns:
+            Matched label, or None if no keyword occurs
+        """
+        found = self.find_keywords(text)
+        if not found:
+            return None
+        priority = min(self._keyword_entries[keyword][0] for keyword in found)
+        return self.entries[priority][1]
+
+    def labels(self, text):
+        """
+        Return every label with at least one keyword in a text.
+
+        Args:
+            text: Lowercased input text
+
+        Returns:
+            Set of matched labels
+        """
+        return {label for _, label in self.matches(text)}
+
+# Shared matchers compiled once per process
+QUERY_CATEGORY_MATCHER = KeywordMatcher(KEYWORD_CATEGORIES.items())
+
+ENTITY_CATEGORY_MATCHER = KeywordMatcher(
+    [(keyword, category) for category, keywords in CATEGORY_KEYWORDS.items() for keyword in keywords] +
+    [(symptom, category) for category, symptoms in COMMON_SYMPTOMS.items() for symptom in symptoms]
+)
@@ -0,0 +1,144 @@
+"""
+OCR engines used by the text extraction workers.
+"""
+
+import os
+import logging
+import threading
+from config import OCR_CONFIG
+
+logger = logging.getLogger(__name__)
+
+class TesserocrEngine:
+    """
+    Runs Tesseract in-process through a persistent tesserocr API handle.
+
+    The language model is loaded once when the engine is created, instead of
+    once per image as with a tesseract subprocess.
+    """
+
+    def __init__(self, language='eng', tessdata_path=None):
+        """
+        Initialize the Tesseract API.
+
+        Args:
+            language: Tesseract language code
+            tessdata_path: Optional directory containing the traineddata files
+        """
+        import tesserocr
+
+        kwargs = {'lang': language}
+        if tessdata_path:
+            kwargs['path'] = tessdata_path
+
+        self._api = tesserocr.PyTessBaseAPI(**kwargs)
+        self._lock = threading.Lock()
+
+    def image_to_string(self, image):
+        """
+        Recognize the text in an image.
+
+        Args:
+            image: PIL image
+
+        Returns:
+            Recognized text
+        """
+        with self._lock:
+            self._api.SetImage(image)
+            text = self._api.GetUTF8Text()
+            self._api.Clear()
+        return text
+
+    def close(self):
+        """Release the Tesseract API."""
+        self._api.End()
+
+class PytesseractEngine:
+    """
+    Runs the tesseract command line tool for each image through pytesseract.
+    """
+
+    def __init__(self, language='eng', tesseract_cmd=None):
+        """
+        Configure pytesseract.
+
+        Args:
+            language: Tesseract language code
+            tesseract_cmd: Path of the tesseract executable (None for the platform default)
+        """
+        import pytesseract
+
+        if tesseract_cmd:
+            pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+        elif os.name == 'nt':  # Windows
+            pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
+        else:  # Linux/Mac
+            pytesseract.pytesseract.tesseract_cmd = 'tesseract'
+
+        self._pytesseract = pytesseract
+        self.language = language
+
+    def image_to_string(self, image):
+        """
+        Recognize the text in an image.
+
+        Args:
+            image: PIL image
+
+        Returns:
+            Recognized text
+        """
+        return self._pytesseract.image_to_string(image, lang=self.language)
+
+    def close(self):
+        """Nothing to release."""
+
+def create_ocr_engine(engine=None):
+    """
+    Create the configured OCR engine.
+
+    tesserocr is used when requested and installed; otherwise pytesseract.
+
+    Args:
+        engine: "tesserocr" or "pytesseract" (defaults to OCR_CONFIG["engine"])
+
+    Returns:
+        OCR engine with an image_to_string method
+    """
+    engine = engine or OCR_CONFIG["engine"]
+
+    if engine == "tesserocr":
+        try:
+            return TesserocrEngine(OCR_CONFIG["language"], OCR_CONFIG["tessdata_path"])
+        except ImportError:
+            logger.warning("tesserocr is not installed; falling back to pytesseract")
+        except RuntimeError as e:
+            logger.warning(f"Could not initialize tesserocr ({str(e)}); falling back to pytesseract")
+    elif engine != "pytesseract":
+        raise ValueError(f"Unknown OCR engine: {engine}")
+
+    return PytesseractEngine(OCR_CONFIG["language"], OCR_CONFIG["tesseract_cmd"])
+
+_engine = None
+_engine_pid = None
+_engine_lock = threading.Lock()
+
+def get_ocr_engine():
+    """
+    Return this process's shared OCR engine, creating it on first use.
+
+    Each worker process gets its own engine; one inherited through fork is
+    not reused.
+
+    Returns:
+        OCR engine with an image_to_string method
+    """
+    global _engine, _engine_pid
+
+    with _engine_lock:
+        if _engine is None or _engine_pid != os.getpid():
+            _engine = create_ocr_engine()
+            _engine_pid = os.getpid()
+            logger.info(f"OCR engine {type(_engine).__name__} ready in process {_engine_pid}")
+        return _engine
@@ -0,0 +1,136 @@
+"""
+Image preprocessing applied to uploaded images before OCR.
+"""
+
+import logging
+import numpy as np
+from PIL import Image, ImageOps
+from config import OCR_CONFIG
+
+logger = logging.getLogger(__name__)
+
+def _target_scale(image, target_dpi, max_dimension):
+    """
+    Compute the downscaling factor for an image.
+
+    Args:
+        image: PIL image
+        target_dpi: Resolution to reduce to when the image records a higher one
+        max_dimension: Maximum length in pixels of the longest side
+
+    Returns:
+        Scale factor, at most 1.0
+    """
+    scale = 1.0
+
+    dpi = image.info.get('dpi')
+    if target_dpi and dpi and dpi[0] > target_dpi:
+        scale = target_dpi / float(dpi[0])
+
+    if max_dimension:
+        scale = min(scale, max_dimension / float(max(image.size)))
+
+    return min(scale, 1.0)
+
+def _otsu_threshold(image):
+    """
+    Find the Otsu threshold of a grayscale image.
+
+    Args:
+        image: PIL image in mode "L"
+
+    Returns:
+        Threshold between 0 and 255
+    """
+    histogram = np.array(image.histogram(), dtype=np.float64)
+    levels = np.arange(256)
+
+    weight_background = np.cumsum(histogram)
+    weight_foreground = weight_background[-1] - weight_background
+    sum_background = np.cumsum(histogram * levels)
+    mean_background = sum_background / np.maximum(weight_background, 1)
+    mean_foreground = (sum_background[-1] - sum_background) / np.maximum(weight_foreground, 1)
+
+    between_class_variance = weight_background * weight_foreground * (mean_background - mean_foreground) ** 2
+    return int(np.argmax(between_class_variance))
+
+def _binarize(image):
+    """Convert a grayscale image to black text on a white background."""
+    threshold = _otsu_threshold(image)
+    return image.point([0] * (threshold + 1) + [255] * (255 - threshold))
+
+def _skew_angle(image, max_angle, step=0.5, sample_size=800):
+    """
+    Estimate the skew of a text image with a projection profile search.
+
+    The angle whose rotation gives the sharpest row profile of dark pixels,
+    i.e. text lines aligned with the rows, is taken as the correction.
+
+    Args:
+        image: PIL image in mode "L"
+        max_angle: Largest correction in degrees to try in either direction
+        step: Angle increment in degrees
+        sample_size: Longest side of the downsampled image used for the search
+
+    Returns:
+        Rotation in degrees (counter-clockwise) that straightens the text
+    """
+    sample = image.copy()
+    sample.thumbnail((sample_size, sample_size))
+    sample = ImageOps.invert(_binarize(sample))
+
+    best_angle, best_score = 0.0, -1.0
+    for angle in np.arange(-max_angle, max_angle + step / 2, step):
+        rotated = np.asarray(sample.rotate(angle, resample=Image.NEAREST), dtype=np.float64)
+        profile = rotated.sum(axis=1)
+        score = float(np.sum(np.diff(profile) ** 2))
+        if score > best_score:
+            best_angle, best_score = float(angle), score
+
+    return best_angle
+
+def preprocess_image(image, settings=None):
+    """
+    Prepare an image for OCR.
+
+    The image is turned upright from its EXIF orientation, downscaled to the
+    target resolution, and optionally converted to grayscale, deskewed and
+    binarized, as configured in OCR_CONFIG.
+
+    Args:
+        image: Opened PIL image (not yet loaded, so JPEGs can be decoded at reduced size)
+        settings: Optional overrides of OCR_CONFIG
+
+    Returns:
+        Preprocessed PIL image
+    """
+    settings = {**OCR_CONFIG, **(settings or {})}
+    if not settings["preprocess"]:
+        return image
+
+    grayscale = settings["grayscale"] or settings["binarize"] or settings["deskew"]
+
+    scale = _target_scale(image, settings["target_dpi"], settings["max_dimension"])
+    if scale < 1.0:
+        size = (max(1, int(image.width * scale)), max(1, int(image.height * scale)))
+        # JPEGs are decoded directly at a reduced size, which is much faster
+        # than decoding full phone-camera resolution and resizing afterwards
+        if image.format == 'JPEG':
+            image.draft('L' if grayscale else image.mode, size)
+        image = image.resize(size, Image.LANCZOS, reducing_gap=2.0)
+
+    image = ImageOps.exif_transpose(image)
+
+    if grayscale:
+        image = image.convert('L')
+
+    if settings["deskew"]:
+        angle = _skew_angle(image, settings["max_skew_angle"])
+        if angle:
+            image = image.rotate(angle, resample=Image.BICUBIC, expand=True, fillcolor=255)
+            logger.debug(f"Deskewed image by {angle:.1f} degrees")
+
+    if settings["binarize"]:
+        image = _binarize(image)
+
+    return image
@@ -0,0 +1,165 @@
+"""
+ONNX export and ONNX Runtime inference backend for the medical transformer.
+"""
+
+import argparse
+import inspect
+import logging
+import os
+import numpy as np
+import torch
+import torch.nn as nn
+from config import INFERENCE_CONFIG, FILE_PATHS
+
+logger = logging.getLogger(__name__)
+
+# Name of the exported graph inside a model bundle directory
+BUNDLE_ONNX_FILE = "model.onnx"
+
+ONNX_INPUT_NAMES = ['input_ids', 'attention_mask', 'token_type_ids']
+
+class _LogitsOnly(nn.Module):
+    """
+    Wraps a MedicalTransformer so the exported graph returns only logits.
+    """
+
+    def __init__(self, model):
+        super(_LogitsOnly, self).__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask, token_type_ids):
+        return self.model.classify(input_ids, attention_mask, token_type_ids)
+
+def export_to_onnx(model, output_path, opset_version=17):
+    """
+    Export a trained model to an ONNX graph.
+
+    The graph takes input_ids, attention_mask and token_type_ids with dynamic
+    batch and sequence axes and returns only the classification logits.
+
+    Args:
+        model: Trained MedicalTransformer
+        output_path: Path of the .onnx file to write
+        opset_version: ONNX opset to target
+
+    Returns:
+        Path of the exported graph
+    """
+    wrapper = _LogitsOnly(model).cpu().eval()
+
+    # Example inputs only fix the rank and dtype; both axes stay dynamic.
+    # The mask pads one row so the masked attention path is traced.
+    dummy = torch.ones(2, 16, dtype=torch.long)
+    dummy_mask = dummy.clone()
+    dummy_mask[1, 8:] = 0
+    dynamic_axes = {name: {0: 'batch', 1: 'sequence'} for name in ONNX_INPUT_NAMES}
+    dynamic_axes['logits'] = {0: 'batch'}
+
+    # Newer torch releases default to the dynamo exporter, which needs onnxscript
+    export_kwargs = {}
+    if 'dynamo' in inspect.signature(torch.onnx.export).parameters:
+        export_kwargs['dynamo'] = False
+
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+
+    with torch.no_grad():
+        torch.onnx.export(
+            wrapper,
+            (dummy, dummy_mask, torch.zeros_like(dummy)),
+            output_path,
+            input_names=ONNX_INPUT_NAMES,
+            output_names=['logits'],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset_version,
+            do_constant_folding=True,
+            **export_kwargs
+        )
+
+    logger.info(f"ONNX model exported to {output_path}")
+    return output_path
+
+class OnnxMedicalClassifier:
+    """
+    Runs an exported MedicalTransformer graph with ONNX Runtime on CPU.
+
+    classify mirrors MedicalTransformer.classify: it takes tokenizer outputs and
+    returns the logits as a torch tensor.
+    """
+
+    def __init__(self, onnx_path, num_threads=None):
+        """
+        Create the inference session.
+
+        Args:
+            onnx_path: Path to the exported .onnx graph
+            num_threads: Optional number of intra-op threads
+        """
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+
+        self.session = ort.InferenceSession(onnx_path, options, providers=['CPUExecutionProvider'])
+        self.input_names = [graph_input.name for graph_input in self.session.get_inputs()]
+
+        logger.info(f"ONNX Runtime session created from {onnx_path}")
+
+    def __call__(self, input_ids, attention_mask, token_type_ids=None):
+        """
+        Run the graph on a batch of tokenized inputs.
+
+        Args:
+            input_ids: Token IDs
+            attention_mask: Attention mask
+            token_type_ids: Optional token type IDs
+
+        Returns:
+            Dictionary containing the logits
+        """
+        return {'logits': self.classify(input_ids, attention_mask, token_type_ids)}
+
+    def classify(self, input_ids, attention_mask, token_type_ids=None):
+        """
+        Run the graph and return only the logits, like MedicalTransformer.classify.
+
+        Args:
+            input_ids: Token IDs
+            attention_mask: Attention mask
+            token_type_ids: Optional token type IDs
+
+        Returns:
+            Classification logits
+        """
+        if token_type_ids is None:
+            token_type_ids = torch.zeros_like(input_ids)
+
+        inputs = {
+            'input_ids': input_ids,
+            'attention_mask': attention_mask,
+            'token_type_ids': token_type_ids
+        }
+        feeds = {name: inputs[name].cpu().numpy().astype(np.int64) for name in self.input_names}
+
+        logits = self.session.run(['logits'], feeds)[0]
+        return torch.from_numpy(logits)
+
+def main():
+    """Export a saved model bundle to ONNX."""
+    from model import MedicalModelTrainer
+
+    parser = argparse.ArgumentParser(description='Export the medical transformer model to ONNX')
+    parser.add_argument('--model', type=str, default=FILE_PATHS["model_save_path"], help='Path to the saved model')
+    parser.add_argument('--output', type=str, help='Path of the .onnx file (default: inside the model bundle)')
+    parser.add_argument('--opset', type=int, default=17, help='ONNX opset version')
+
+    args = parser.parse_args()
+
+    output_path = args.output or INFERENCE_CONFIG["onnx_model_path"] or os.path.join(args.model, BUNDLE_ONNX_FILE)
+    model = MedicalModelTrainer.load_model(args.model)
+    export_to_onnx(model, output_path, opset_version=args.opset)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,92 @@
+"""
+Bounded in-memory cache with LRU and TTL eviction.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries also expire after a fixed time.
+
+    Once max_entries is reached the least recently used entry is evicted.
+    Hit, miss and eviction counts are kept for monitoring.
+    """
+
+    def __init__(self, max_entries=4096, ttl_seconds=3600, clock=time.monotonic):
+        """
+        Initialize the cache.
+
+        Args:
+            max_entries: Maximum number of entries kept
+            ttl_seconds: Seconds after which an entry expires
+            clock: Function returning the current time in seconds
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """
+        Look up a key.
+
+        Args:
+            key: Cache key
+
+        Returns:
+            Cached value, or None if the key is missing or expired
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > self.clock():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        """
+        Store a value, evicting the least recently used entry if full.
+
+        Args:
+            key: Cache key
+            value: Value to store
+        """
+        with self._lock:
+            self._entries[key] = (value, self.clock() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Remove all entries."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Return the cache size and hit/miss/eviction counters."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
@@ -19,18 +19,24 @@ def setup():
     os.makedirs("static", exist_ok=True)
     os.makedirs("static/css", exist_ok=True)
     os.makedirs("static/js", exist_ok=True)
-    os.makedirs("uploads", exist_ok=True)
     os.makedirs("conversations", exist_ok=True)
     
+    # Download the NLTK data and tokenizer used at runtime
+    print("\nDownloading NLTK data and tokenizer...")
+    from text_normalizer import ensure_nltk_resources
+    ensure_nltk_resources(download=True)
+    from tokenizer_registry import get_tokenizer
+    get_tokenizer(local_files_only=False)
+    
     # Create synthetic data
     print("\nGenerating synthetic data...")
     from create_synthetic_data import create_synthetic_data
     create_synthetic_data()
     
-    # Create model pickle file
-    print("\nCreating model pickle file...")
-    from create_model_pickle import create_model_pickle
-    create_model_pickle()
+    # Create model bundle
+    print("\nCreating model bundle...")
+    from create_model_bundle import create_model_bundle
+    create_model_bundle()
     
     print("\nSetup complete! You can now run the application with:")
     print("python app.py")
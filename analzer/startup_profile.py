@@ -0,0 +1,88 @@
+"""
+Startup readiness tracking and per-component cold-start timings.
+"""
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+class StartupProfile:
+    """
+    Records how long each startup component takes and whether startup is done.
+
+    Components are timed with the component() context manager, in whichever
+    thread loads them. Once everything is loaded, mark_ready() logs a
+    breakdown and readiness checks start to pass.
+    """
+
+    def __init__(self, clock=time.perf_counter):
+        """
+        Start the startup clock.
+
+        Args:
+            clock: Function returning the current time in seconds
+        """
+        self.clock = clock
+        self.started_at = clock()
+        self.timings = {}
+        self.error = None
+        self.ready_after = None
+
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def component(self, name):
+        """
+        Time the loading of one startup component.
+
+        Args:
+            name: Component name used in the report
+        """
+        start = self.clock()
+        try:
+            yield
+        finally:
+            elapsed = self.clock() - start
+            with self._lock:
+                self.timings[name] = elapsed
+            logger.info(f"Startup: {name} loaded in {elapsed:.2f}s")
+
+    def mark_ready(self):
+        """Mark startup as complete and log the timing breakdown."""
+        self.ready_after = self.clock() - self.started_at
+        self._ready.set()
+
+        breakdown = ', '.join(f"{name} {elapsed:.2f}s" for name, elapsed in self.timings.items())
+        logger.info(f"Ready after {self.ready_after:.2f}s ({breakdown})")
+
+    def mark_failed(self, error):
+        """
+        Record a startup failure; the service then never becomes ready.
+
+        Args:
+            error: Exception raised while loading
+        """
+        self.error = error
+        logger.error(f"Startup failed: {str(error)}")
+
+    @property
+    def ready(self):
+        """Whether all components have loaded."""
+        return self._ready.is_set()
+
+    def report(self):
+        """Return readiness, the failure if any, and the per-component timings."""
+        with self._lock:
+            timings = {name: round(elapsed, 3) for name, elapsed in self.timings.items()}
+
+        return {
+            'ready': self.ready,
+            'error': str(self.error) if self.error is not None else None,
+            'uptime_seconds': round(self.clock() - self.started_at, 3),
+            'ready_after_seconds': round(self.ready_after, 3) if self.ready_after is not None else None,
+            'components': timings
+        }
@@ -0,0 +1,489 @@
+"""
+Text extraction from uploaded documents and images, run in a worker process pool.
+"""
+
+import os
+import logging
+import multiprocessing
+import threading
+import time
+import weakref
+import io
+import shutil
+import tempfile
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import Future, InvalidStateError, ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from config import EXTRACTION_CONFIG, PDF_CONFIG
+from ocr_engine import get_ocr_engine
+
+logger = logging.getLogger(__name__)
+
+class ExtractionBusyError(Exception):
+    """Raised when the extraction queue is full."""
+
+class ExtractionTimeoutError(Exception):
+    """Raised when an extraction job does not finish in time."""
+
+def _open_source(source):
+    """
+    Open an upload for reading.
+
+    Args:
+        source: Upload contents as bytes, or the path of a spooled upload file
+
+    Returns:
+        Binary file object
+    """
+    if isinstance(source, (bytes, bytearray)):
+        return io.BytesIO(source)
+    return open(source, 'rb')
+
+@contextmanager
+def spool_upload(stream, max_in_memory=None, spool_dir=None):
+    """
+    Read an upload stream, keeping it in memory unless it is large.
+
+    Uploads up to max_in_memory bytes are returned as bytes and never touch
+    the disk. Larger ones are written to a uniquely named temporary file that
+    is removed when the context exits.
+
+    Args:
+        stream: Readable binary stream of the upload
+        max_in_memory: Size threshold in bytes (defaults to EXTRACTION_CONFIG)
+        spool_dir: Directory for spilled uploads (defaults to EXTRACTION_CONFIG)
+
+    Yields:
+        Upload contents as bytes, or the path of the temporary file
+    """
+    if max_in_memory is None:
+        max_in_memory = EXTRACTION_CONFIG["max_in_memory_bytes"]
+
+    data = stream.read(max_in_memory + 1)
+    if len(data) <= max_in_memory:
+        yield data
+        return
+
+    fd, path = tempfile.mkstemp(suffix='.upload', dir=spool_dir or EXTRACTION_CONFIG["spool_dir"])
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            del data
+            shutil.copyfileobj(stream, f)
+        yield path
+    finally:
+        os.remove(path)
+
+def extract_text_from_file(source, filename):
+    """
+    Extract text from various file formats including images.
+
+    Args:
+        source: Upload contents as bytes, or a file path
+        filename: Original file name, used to detect the format
+
+    Returns:
+        Extracted text
+    """
+    file_type = filename.rsplit('.', 1)[1].lower()
+
+    try:
+        # Handle image files
+        if file_type in ['png', 'jpg', 'jpeg', 'bmp']:
+            from PIL import Image
+            from ocr_preprocessing import preprocess_image
+
+            with _open_source(source) as f:
+                image = preprocess_image(Image.open(f))
+                # Perform OCR on the image with this process's engine
+                text = get_ocr_engine().image_to_string(image)
+            return text.strip()
+
+        # Handle text files
+        elif file_type == 'txt':
+            with _open_source(source) as f:
+                return f.read().decode('utf-8')
+
+        # Handle PDF files
+        elif file_type == 'pdf':
+            return ' '.join(extract_pdf_pages(source, stop_after_chars=PDF_CONFIG["stop_after_chars"]))
+
+        # Handle Word documents
+        elif file_type in ['doc', 'docx']:
+            import docx
+
+            with _open_source(source) as f:
+                doc = docx.Document(f)
+            return ' '.join([paragraph.text for paragraph in doc.paragraphs])
+
+    except Exception as e:
+        logger.error(f"Error extracting text from {filename}: {str(e)}")
+        raise ValueError(f"Could not extract text from {filename}")
+
+def count_pdf_pages(source):
+    """
+    Count the pages of a PDF file.
+
+    Args:
+        source: PDF contents as bytes, or a file path
+
+    Returns:
+        Number of pages
+    """
+    import PyPDF2
+
+    with _open_source(source) as f:
+        return len(PyPDF2.PdfReader(f).pages)
+
+def extract_pdf_pages(source, start=0, stop=None, stop_after_chars=None):
+    """
+    Extract the text of a range of PDF pages, one page at a time.
+
+    Args:
+        source: PDF contents as bytes, or a file path
+        start: Index of the first page
+        stop: Index after the last page (capped at PDF_CONFIG["max_pages"])
+        stop_after_chars: Stop early once this much text has been collected
+
+    Returns:
+        List of page texts
+    """
+    import PyPDF2
+
+    pages = []
+    collected_chars = 0
+
+    with _open_source(source) as f:
+        pdf_reader = PyPDF2.PdfReader(f)
+        stop = min(len(pdf_reader.pages), PDF_CONFIG["max_pages"], stop if stop is not None else float('inf'))
+
+        for page_number in range(start, stop):
+            page_text = pdf_reader.pages[page_number].extract_text() or ''
+            pages.append(page_text)
+
+            collected_chars += len(page_text)
+            if stop_after_chars and collected_chars >= stop_after_chars:
+                break
+
+    return pages
+
+def _warm_up():
+    """Job used to start a worker process and load its extractors and OCR engine."""
+    import PyPDF2
+    import docx
+    import ocr_preprocessing
+
+    get_ocr_engine()
+    return os.getpid()
+
+def _log_warm_up_failure(future):
+    """Log a warm-up job that failed; the worker loads lazily on first use instead."""
+    if not future.cancelled() and future.exception() is not None:
+        logger.warning(f"Extraction worker warm-up failed: {str(future.exception())}")
+
+class _ExtractionJob(Future):
+    """
+    Future for an extraction job that survives pool restarts.
+
+    The job runs as a future of the current process pool. If that pool is
+    restarted while the job is queued or running, the job is submitted again
+    to the new pool instead of failing.
+    """
+
+    def __init__(self, fn, args):
+        super().__init__()
+        self.fn = fn
+        self.args = args
+        self.attempt = None     # Future of the current run in the process pool
+        self.executor = None    # Pool running the current attempt
+        self.resubmits = 0
+
+    def cancel(self):
+        """Cancel the job if it has not started running in a worker."""
+        attempt = self.attempt
+        if attempt is not None and not attempt.cancel():
+            return False
+        return super().cancel()
+
+class ExtractionPool:
+    """
+    Bounded process pool for CPU-heavy text extraction.
+
+    OCR and document parsing run in separate worker processes so they do not
+    hold up the web server threads, and their capacity is sized independently
+    through EXTRACTION_CONFIG. At most max_workers jobs run at once and at
+    most max_queued more wait; further requests are rejected immediately.
+
+    A job that times out while running is stopped by restarting the pool,
+    since a process pool cannot lose a single worker without breaking. Other
+    jobs caught by that restart are resubmitted to the new pool, whose workers
+    are started with restart_start_method so they do not inherit the loaded
+    server process. If a worker dies on its own, the pool is restarted and
+    its jobs fail with BrokenProcessPool.
+    """
+
+    def __init__(self, max_workers=None, max_queued=None, timeout=None, start_method=None):
+        """
+        Initialize the pool and start its worker processes.
+
+        Args:
+            max_workers: Number of extraction worker processes
+            max_queued: Number of jobs allowed to wait for a free worker
+            timeout: Default per-job timeout in seconds
+            start_method: multiprocessing start method (None for the platform default)
+        """
+        self.max_workers = max_workers or EXTRACTION_CONFIG["max_workers"]
+        self.max_queued = max_queued if max_queued is not None else EXTRACTION_CONFIG["max_queued"]
+        self.timeout = timeout or EXTRACTION_CONFIG["timeout"]
+        self._context = multiprocessing.get_context(start_method or EXTRACTION_CONFIG["start_method"])
+
+        # Replacement workers must not be forked from the running server
+        restart_method = EXTRACTION_CONFIG["restart_start_method"]
+        if restart_method not in multiprocessing.get_all_start_methods():
+            restart_method = 'spawn'
+        self._restart_context = multiprocessing.get_context(restart_method)
+
+        self._slots = threading.BoundedSemaphore(self.max_workers + self.max_queued)
+        self._lock = threading.Lock()
+        self._executor = self._create_executor()
+
+        # Pools replaced after a timeout, whose other jobs are resubmitted
+        self._timed_out_executors = weakref.WeakSet()
+
+    def _create_executor(self, context=None):
+        """Create a process pool and start its workers right away."""
+        executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context or self._context)
+        # Submitting now, rather than on the first upload, starts the workers
+        # before the model and server threads exist in this process. The
+        # workers then load the extractors and OCR language model in the
+        # background, without holding up startup.
+        for _ in range(self.max_workers):
+            executor.submit(_warm_up).add_done_callback(_log_warm_up_failure)
+        return executor
+
+    def _restart(self, executor, reason, timed_out=False):
+        """
+        Kill all workers of a pool, including stuck ones, and start a fresh pool.
+
+        Args:
+            executor: Pool to replace; nothing is done if it was already replaced
+            reason: Why the pool is restarted, for the log
+            timed_out: Whether a timed-out job is being stopped, in which case
+                the other jobs of the pool are resubmitted by _finish
+        """
+        with self._lock:
+            if executor is not self._executor:
+                return
+            if timed_out:
+                self._timed_out_executors.add(executor)
+            self._executor = self._create_executor(self._restart_context)
+
+        # Jobs still queued or running in the old pool fail or are cancelled
+        terminate_workers = getattr(executor, 'terminate_workers', None)
+        if terminate_workers is not None:
+            terminate_workers()
+        else:
+            for process in list((executor._processes or {}).values()):
+                process.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+        logger.warning(f"Extraction pool restarted after {reason}")
+
+    def _start(self, job):
+        """Run a job on the current pool, restarting the pool once if it is broken."""
+        for _ in range(2):
+            with self._lock:
+                executor = self._executor
+            try:
+                job.executor = executor
+                job.attempt = executor.submit(job.fn, *job.args)
+                break
+            except BrokenProcessPool:
+                self._restart(executor, "a worker process died")
+        else:
+            raise BrokenProcessPool("Extraction workers could not be restarted")
+
+        job.attempt.add_done_callback(lambda attempt: self._finish(job, attempt))
+
+    def _finish(self, job, attempt):
+        """Pass the result of a job's run on to the job, or run it again after a timeout restart."""
+        if attempt is not job.attempt or job.done():
+            return
+
+        restarted = job.executor is not self._executor
+        if attempt.cancelled() and not restarted:
+            # Cancelled by the caller before it started
+            Future.cancel(job)
+            return
+
+        try:
+            if attempt.cancelled() or isinstance(attempt.exception(), BrokenProcessPool):
+                if (job.executor in self._timed_out_executors
+                        and job.resubmits < EXTRACTION_CONFIG["max_resubmits"]):
+                    # Stopped only because another job timed out
+                    job.resubmits += 1
+                    try:
+                        self._start(job)
+                    except Exception as e:
+                        job.set_exception(e)
+                    return
+
+                # A worker died on its own, e.g. killed for using too much
+                # memory; there is no telling which job caused it
+                self._restart(job.executor, "a worker process died")
+                job.set_exception(BrokenProcessPool("An extraction worker process died"))
+            elif attempt.exception() is not None:
+                job.set_exception(attempt.exception())
+            else:
+                job.set_result(attempt.result())
+        except InvalidStateError:
+            # The job timed out in wait() meanwhile
+            pass
+
+    def submit(self, fn, *args):
+        """
+        Queue a job on the pool.
+
+        Args:
+            fn: Picklable function to run in a worker process
+            *args: Arguments for fn
+
+        Returns:
+            Future for the job's result
+        """
+        if not self._slots.acquire(blocking=False):
+            raise ExtractionBusyError("Too many documents are being processed, please retry shortly")
+
+        job = _ExtractionJob(fn, args)
+        try:
+            self._start(job)
+        except Exception:
+            self._slots.release()
+            raise
+
+        # The slot is held until the job's last run has stopped in its worker
+        job.add_done_callback(lambda _: self._release_when_stopped(job))
+        return job
+
+    def _release_when_stopped(self, job):
+        """Free a job's slot once its run in the process pool is over."""
+        job.attempt.add_done_callback(lambda _: self._slots.release())
+
+    def wait(self, future, timeout=None):
+        """
+        Wait for a job, cancelling it if it runs past the timeout.
+
+        Args:
+            future: Future returned by submit
+            timeout: Seconds to wait (defaults to the pool timeout)
+
+        Returns:
+            The job's result
+        """
+        try:
+            return future.result(timeout=timeout or self.timeout)
+        except FutureTimeoutError:
+            # Queued jobs can simply be cancelled; a running one needs its
+            # worker killed to stop using CPU
+            if not future.cancel():
+                try:
+                    # Fail the job first so the restart does not resubmit it
+                    future.set_exception(ExtractionTimeoutError("Text extraction timed out"))
+                except InvalidStateError:
+                    # It finished just now
+                    return future.result()
+                self._restart(future.executor, "a job timed out", timed_out=True)
+            raise ExtractionTimeoutError("Text extraction timed out")
+
+    def extract(self, source, filename, timeout=None):
+        """
+        Extract text from a file in a worker process.
+
+        Args:
+            source: Upload contents as bytes, or a file path
+            filename: Original file name, used to detect the format
+            timeout: Seconds to wait (defaults to the pool timeout)
+
+        Returns:
+            Extracted text
+        """
+        return self.wait(self.submit(extract_text_from_file, source, filename), timeout)
+
+    def extract_pages(self, source, filename, timeout=None):
+        """
+        Extract text from a file as a list of chunks in a worker process.
+
+        PDFs are split into page ranges that are extracted in parallel and
+        returned page by page; other formats are returned as a single chunk.
+
+        Args:
+            source: Upload contents as bytes, or a file path
+            filename: Original file name, used to detect the format
+            timeout: Seconds to wait (defaults to the pool timeout)
+
+        Returns:
+            List of text chunks
+        """
+        if filename.rsplit('.', 1)[1].lower() == 'pdf':
+            return self.extract_pdf(source, timeout)
+
+        text = self.extract(source, filename, timeout)
+        return [text] if text else []
+
+    def extract_pdf(self, source, timeout=None):
+        """
+        Extract PDF text page by page, spreading page ranges over the workers.
+
+        At most PDF_CONFIG["max_pages"] pages are read. Ranges are collected
+        in page order and extraction stops once PDF_CONFIG["stop_after_chars"]
+        characters are available, cancelling ranges not yet started.
+
+        Args:
+            source: PDF contents as bytes, or a file path
+            timeout: Seconds to wait for the whole document (defaults to the pool timeout)
+
+        Returns:
+            List of page texts
+        """
+        deadline = time.monotonic() + (timeout or self.timeout)
+
+        def remaining():
+            return max(0.001, deadline - time.monotonic())
+
+        num_pages = min(self.wait(self.submit(count_pdf_pages, source), remaining()), PDF_CONFIG["max_pages"])
+        pages_per_job = PDF_CONFIG["pages_per_job"]
+        ranges = [(start, min(start + pages_per_job, num_pages)) for start in range(0, num_pages, pages_per_job)]
+
+        pages = []
+        collected_chars = 0
+        in_flight = deque()
+        try:
+            while ranges or in_flight:
+                # Keep up to one range per worker in flight for this document
+                while ranges and len(in_flight) < self.max_workers:
+                    try:
+                        in_flight.append(self.submit(extract_pdf_pages, source, *ranges[0]))
+                    except ExtractionBusyError:
+                        if not in_flight:
+                            raise
+                        break
+                    ranges.pop(0)
+
+                range_pages = self.wait(in_flight.popleft(), remaining())
+                pages.extend(range_pages)
+
+                collected_chars += sum(len(page) for page in range_pages)
+                if PDF_CONFIG["stop_after_chars"] and collected_chars >= PDF_CONFIG["stop_after_chars"]:
+                    break
+        finally:
+            # Ranges already running finish in the background and are ignored
+            for future in in_flight:
+                future.cancel()
+
+        logger.info(f"Extracted {len(pages)} of {num_pages} PDF pages")
+
+        return pages
+
+    def shutdown(self):
+        """Stop the worker processes."""
+        self._executor.shutdown(wait=True, cancel_futures=True)
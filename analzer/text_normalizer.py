@@ -0,0 +1,154 @@
+"""
+Fast text normalization producing the same output as the NLTK pipeline.
+"""
+
+import re
+from functools import lru_cache
+import pandas as pd
+from config import DATA_CONFIG
+
+# NLTK data used by the normalizer, as (resource path, package name)
+NLTK_RESOURCES = [
+    ('corpora/stopwords', 'stopwords'),
+    ('corpora/wordnet', 'wordnet')
+]
+
+def ensure_nltk_resources(download=False):
+    """
+    Check that the NLTK data used for normalization is installed.
+
+    Args:
+        download: Download missing packages instead of failing
+
+    Raises:
+        LookupError: If a package is missing and was not downloaded
+    """
+    import nltk
+
+    def missing_packages():
+        missing = []
+        for resource, package in NLTK_RESOURCES:
+            try:
+                nltk.data.find(resource)
+            except LookupError:
+                missing.append(package)
+        return missing
+
+    missing = missing_packages()
+    if missing and download:
+        for package in missing:
+            nltk.download(package, quiet=True)
+        missing = missing_packages()
+
+    if missing:
+        raise LookupError(
+            f"NLTK data not installed: {', '.join(missing)}; run setup.py or "
+            f"python -m nltk.downloader {' '.join(missing)}"
+        )
+
+# Everything except ASCII letters and whitespace is dropped before tokenizing
+_NON_LETTERS = re.compile(r'[^a-zA-Z\s]')
+
+# Once text is reduced to lowercase letters and whitespace, NLTK's word_tokenize
+# only differs from str.split() by these Treebank contraction splits
+TREEBANK_SPLITS = {
+    'cannot': ('can', 'not'),
+    'gimme': ('gim', 'me'),
+    'gonna': ('gon', 'na'),
+    'gotta': ('got', 'ta'),
+    'lemme': ('lem', 'me'),
+    'wanna': ('wan', 'na')
+}
+
+class TextNormalizer:
+    """
+    Lowercases text, strips non-letters, removes stopwords and lemmatizes.
+
+    The output matches regex cleaning followed by NLTK word_tokenize, stopword
+    removal and WordNetLemmatizer.lemmatize for every token. Words are split on
+    whitespace and the result for each distinct word is memoized in a bounded
+    LRU table, so repeated vocabulary costs a single lookup. The NLTK stopwords
+    and WordNet data are loaded on first use.
+    """
+
+    def __init__(self, stop_words=None, lemma_cache_size=None):
+        """
+        Initialize the normalizer.
+
+        Args:
+            stop_words: Words to remove (defaults to NLTK's English stopwords)
+            lemma_cache_size: Maximum number of memoized words (defaults to DATA_CONFIG)
+        """
+        if lemma_cache_size is None:
+            lemma_cache_size = DATA_CONFIG["lemma_cache_size"]
+
+        self._stop_words = frozenset(stop_words) if stop_words is not None else None
+        self._lemmatizer = None
+        self._normalize_word = lru_cache(maxsize=lemma_cache_size)(self._lemmatize_word)
+
+    @property
+    def stop_words(self):
+        """Stopwords removed from the text, loaded on first use."""
+        if self._stop_words is None:
+            ensure_nltk_resources()
+            from nltk.corpus import stopwords
+            self._stop_words = frozenset(stopwords.words('english'))
+        return self._stop_words
+
+    @property
+    def lemmatizer(self):
+        """WordNet lemmatizer, created on first use."""
+        if self._lemmatizer is None:
+            ensure_nltk_resources()
+            from nltk.stem import WordNetLemmatizer
+            self._lemmatizer = WordNetLemmatizer()
+        return self._lemmatizer
+
+    def _lemmatize_word(self, word):
+        """
+        Return the output tokens for one whitespace-separated word.
+
+        Args:
+            word: Lowercase letter-only word
+
+        Returns:
+            Tuple of lemmatized tokens that are not stopwords
+        """
+        return tuple(
+            self.lemmatizer.lemmatize(token)
+            for token in TREEBANK_SPLITS.get(word, (word,))
+            if token not in self.stop_words
+        )
+
+    def normalize(self, text):
+        """
+        Clean and normalize a text.
+
+        Args:
+            text: Input text
+
+        Returns:
+            Cleaned text
+        """
+        normalize_word = self._normalize_word
+        words = _NON_LETTERS.sub('', text.lower()).split()
+        return ' '.join([token for word in words for token in normalize_word(word)])
+
+    def normalize_batch(self, texts):
+        """
+        Clean and normalize several texts.
+
+        Args:
+            texts: List or pandas Series of input texts
+
+        Returns:
+            Cleaned texts, as a Series with the same index if a Series was given
+        """
+        cleaned = [self.normalize(text) for text in texts]
+        if isinstance(texts, pd.Series):
+            return pd.Series(cleaned, index=texts.index, name=texts.name)
+        return cleaned
+
+    def cache_info(self):
+        """Return hit and size statistics of the memoized word table."""
+        return self._normalize_word.cache_info()
@@ -0,0 +1,58 @@
+"""
+Process-wide registry of lazily loaded fast tokenizers.
+"""
+
+import logging
+import threading
+import time
+from config import TOKENIZER_CONFIG
+
+logger = logging.getLogger(__name__)
+
+_tokenizers = {}
+_lock = threading.Lock()
+
+def get_tokenizer(name=None, local_files_only=None):
+    """
+    Return the shared fast tokenizer, loading it on first use.
+
+    Every component asking for the same tokenizer gets the same Rust-backed
+    BertTokenizerFast instance. By default it is read from the local Hugging
+    Face cache only, without network access.
+
+    Args:
+        name: Pre-trained tokenizer name or local directory (defaults to TOKENIZER_CONFIG)
+        local_files_only: Load from the local cache only (defaults to TOKENIZER_CONFIG)
+
+    Returns:
+        Shared tokenizer instance
+    """
+    name = name or TOKENIZER_CONFIG["name"]
+
+    tokenizer = _tokenizers.get(name)
+    if tokenizer is not None:
+        return tokenizer
+
+    with _lock:
+        tokenizer = _tokenizers.get(name)
+        if tokenizer is None:
+            from transformers import BertTokenizerFast
+
+            if local_files_only is None:
+                local_files_only = TOKENIZER_CONFIG["local_files_only"]
+
+            start = time.perf_counter()
+            tokenizer = BertTokenizerFast.from_pretrained(name, local_files_only=local_files_only)
+
+            # Some transformers releases build an empty vocabulary instead of
+            # failing when the files are missing
+            if tokenizer.vocab_size <= len(tokenizer.all_special_tokens):
+                raise OSError(
+                    f"Tokenizer {name} not found in the local cache; run setup.py or set "
+                    f"TOKENIZER_CONFIG['local_files_only'] to False to download it"
+                )
+
+            _tokenizers[name] = tokenizer
+            logger.info(f"Tokenizer {name} loaded in {time.perf_counter() - start:.2f}s")
+
+    return tokenizer
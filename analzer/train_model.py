@@ -1,24 +1,22 @@
 """
-Script to train the medical transformer model and save it as a pickle file.
+Script to train the medical transformer model and save it as a model bundle.
 """
 
 import os
 import sys
 import argparse
 import logging
-import pickle
 import torch
 import matplotlib.pyplot as plt
 import numpy as np
 from tqdm import tqdm
-import nltk
-nltk.download('punkt_tab')
 
 # Import local modules
 from data_generator import SyntheticMedicalDataGenerator
 from data_processor import MedicalDataProcessor
-from model import MedicalModelTrainer, MedicalTransformer
-from config import FILE_PATHS, MEDICAL_CATEGORIES, DATA_CONFIG
+from text_normalizer import ensure_nltk_resources
+from model import MedicalModelTrainer, MedicalTransformer, update_bundle_config
+from config import FILE_PATHS, MEDICAL_CATEGORIES, DATA_CONFIG, TRAINING_CONFIG
 
 # Set up logging
 os.makedirs(os.path.dirname(FILE_PATHS["logs_path"]), exist_ok=True)
@@ -66,7 +64,9 @@ def generate_synthetic_data(num_samples=None, save_path=None):
 
     return save_path
 
-def train_model(data_path=None, model_save_path=None, epochs=None, batch_size=None, patience=10):
+def train_model(data_path=None, model_save_path=None, epochs=None, batch_size=None, patience=10,
+                quantize=False, max_accuracy_drop=0.01, use_dataset_cache=None, precision=None,
+                accum_steps=None, checkpoint_path=None, resume=False, eval_steps=None):
     """
     Train the medical transformer model with early stopping.
 
@@ -75,7 +75,18 @@ def train_model(data_path=None, model_save_path=None, epochs=None, batch_size=No
         model_save_path: Path to save the trained model
         epochs: Number of training epochs
         batch_size: Batch size for training
-        patience: Number of epochs to wait for improvement before early stopping
+        patience: Number of evaluations (epochs, or eval_steps evaluations) to wait
+            for improvement before early stopping
+        quantize: Evaluate dynamic int8 quantization of the saved model and
+            record the result in its bundle
+        max_accuracy_drop: Largest held-out accuracy loss for which quantized
+            serving is enabled in the bundle
+        use_dataset_cache: Reuse tokenized tensors from earlier runs (defaults to DATA_CONFIG)
+        precision: "fp32" or "bf16" training precision (defaults to TRAINING_CONFIG)
+        accum_steps: Batches accumulated per optimizer step (defaults to TRAINING_CONFIG)
+        checkpoint_path: File for resumable training checkpoints (defaults to FILE_PATHS)
+        resume: Continue an interrupted run from its checkpoint
+        eval_steps: Optimizer steps between evaluations on a test subsample (defaults to TRAINING_CONFIG)
 
     Returns:
         Dictionary of training statistics
@@ -86,6 +97,9 @@ def train_model(data_path=None, model_save_path=None, epochs=None, batch_size=No
     if model_save_path is None:
         model_save_path = FILE_PATHS["model_save_path"]
 
+    if checkpoint_path is None:
+        checkpoint_path = FILE_PATHS["checkpoint_path"]
+
     # Create directory if it doesn't exist
     os.makedirs(os.path.dirname(model_save_path), exist_ok=True)
 
@@ -97,19 +111,21 @@ def train_model(data_path=None, model_save_path=None, epochs=None, batch_size=No
     logger.info("Preparing dataset...")
 
     # Initialize data processor
-    processor = MedicalDataProcessor()
+    processor = MedicalDataProcessor(max_seq_length=TRAINING_CONFIG["max_seq_length"])
 
     # Prepare dataset
     train_dataset, test_dataset = processor.prepare_dataset(
         data_path=data_path,
         test_size=1 - DATA_CONFIG["train_test_split"],
-        random_state=DATA_CONFIG["seed"]
+        random_state=DATA_CONFIG["seed"],
+        use_cache=use_dataset_cache
     )
 
-    logger.info(f"Dataset prepared. Train size: {len(train_dataset['input_ids'])}, Test size: {len(test_dataset['input_ids'])}")
+    logger.info(f"Dataset prepared. Train size: {len(train_dataset['lengths'])}, Test size: {len(test_dataset['lengths'])}")
 
     # Initialize trainer
-    trainer = MedicalModelTrainer(num_labels=len(MEDICAL_CATEGORIES))
+    trainer = MedicalModelTrainer(num_labels=len(MEDICAL_CATEGORIES), precision=precision)
+    trainer.label_map = train_dataset.get('category_mapping')
 
     # Override training parameters if provided
     if epochs is not None:
@@ -118,7 +134,16 @@ def train_model(data_path=None, model_save_path=None, epochs=None, batch_size=No
     if batch_size is not None:
         trainer.batch_size = batch_size
 
-    logger.info(f"Training with {trainer.num_epochs} epochs and batch size {trainer.batch_size}")
+    if accum_steps is not None:
+        trainer.accum_steps = accum_steps
+
+    if eval_steps is not None:
+        trainer.eval_steps = eval_steps
+
+    logger.info(
+        f"Training with {trainer.num_epochs} epochs, batch size {trainer.batch_size} and "
+        f"{trainer.accum_steps} accumulation steps"
+    )
 
     # Create dataloaders
     train_dataloader, test_dataloader = trainer.create_dataloaders(train_dataset, test_dataset)
@@ -129,13 +154,85 @@ def train_model(data_path=None, model_save_path=None, epochs=None, batch_size=No
         train_dataloader=train_dataloader,
         test_dataloader=test_dataloader,
         save_path=model_save_path,
-        patience=patience
+        patience=patience,
+        checkpoint_path=checkpoint_path,
+        resume=resume
     )
 
     logger.info(f"Model training complete! Model saved to {model_save_path}")
 
+    if trainer.precision != "fp32":
+        evaluate_precision(trainer, train_dataloader, test_dataloader, model_save_path)
+
+    if quantize:
+        evaluate_quantization(trainer, test_dataloader, model_save_path, max_accuracy_drop)
+
     return training_stats
 
+def evaluate_precision(trainer, train_dataloader, test_dataloader, model_save_path):
+    """
+    Measure the effect of the training precision against an fp32 baseline and record it.
+
+    Short matched training runs in fp32 and in the training precision are
+    compared (see MedicalModelTrainer.training_precision_report), and the
+    saved model is evaluated in the training precision. The report is stored
+    under "training_precision" in the bundle config.
+
+    Args:
+        trainer: Trainer used for training
+        train_dataloader: DataLoader for the training split
+        test_dataloader: DataLoader for the held-out split
+        model_save_path: Path of the saved model bundle
+
+    Returns:
+        Precision report dictionary
+    """
+    report = trainer.training_precision_report(
+        train_dataloader, test_dataloader, TRAINING_CONFIG["precision_baseline_examples"]
+    )
+
+    model = MedicalModelTrainer.load_model(model_save_path).to(trainer.device)
+    report["final_accuracy"] = trainer.evaluate(test_dataloader, model=model)['accuracy']
+
+    update_bundle_config(model_save_path, {"training_precision": report})
+
+    logger.info(
+        f"{report['precision']} training: {report['train_speedup']:.2f}x fp32 training throughput, "
+        f"accuracy change {report['accuracy_change']:+.4f} on {report['baseline_examples']} examples; "
+        f"final accuracy {report['final_accuracy']:.4f}"
+    )
+    return report
+
+def evaluate_quantization(trainer, test_dataloader, model_save_path, max_accuracy_drop):
+    """
+    Measure the effect of int8 quantization on the saved model and record it.
+
+    The report is stored under "quantization" in the bundle config, with
+    "enabled" set when the accuracy loss is within max_accuracy_drop, so
+    MedicalResponseGenerator quantizes the model at load time.
+
+    Args:
+        trainer: Trainer used for training
+        test_dataloader: DataLoader for the held-out split
+        model_save_path: Path of the saved model bundle
+        max_accuracy_drop: Largest accepted accuracy loss
+
+    Returns:
+        Quantization report dictionary
+    """
+    model = MedicalModelTrainer.load_model(model_save_path).to(trainer.device)
+    report = trainer.quantization_report(test_dataloader, model=model)
+    report["enabled"] = -report["accuracy_change"] <= max_accuracy_drop
+
+    update_bundle_config(model_save_path, {"quantization": report})
+
+    if report["enabled"]:
+        logger.info(f"Quantized serving enabled in {model_save_path}")
+    else:
+        logger.info(f"Accuracy drop exceeds {max_accuracy_drop}; quantized serving left disabled")
+
+    return report
+
 def plot_training_stats(training_stats, save_path=None):
     """
     Plot training statistics.
@@ -219,11 +316,22 @@ def main():
     parser.add_argument('--samples', type=int, help='Number of synthetic samples to generate')
     parser.add_argument('--epochs', type=int, help='Number of training epochs')
     parser.add_argument('--batch_size', type=int, help='Batch size for training')
-    parser.add_argument('--patience', type=int, default=10, help='Number of epochs to wait before early stopping')
+    parser.add_argument('--accum_steps', type=int, help='Batches accumulated per optimizer step (effective batch = batch_size x accum_steps)')
+    parser.add_argument('--patience', type=int, default=10, help='Number of evaluations to wait before early stopping')
+    parser.add_argument('--eval_steps', type=int, help='Evaluate on a test subsample every N optimizer steps (default: once per epoch)')
     parser.add_argument('--no_plot', action='store_true', help='Disable plotting of training statistics')
+    parser.add_argument('--quantize', action='store_true', help='Evaluate int8 quantization and enable it if accuracy holds')
+    parser.add_argument('--max_accuracy_drop', type=float, default=0.01, help='Largest accuracy loss accepted for quantized serving')
+    parser.add_argument('--no_dataset_cache', action='store_true', help='Re-tokenize the dataset instead of using the on-disk cache')
+    parser.add_argument('--checkpoint', type=str, help='Training checkpoint file (default: FILE_PATHS["checkpoint_path"])')
+    parser.add_argument('--resume', action='store_true', help='Continue an interrupted run from its checkpoint')
+    parser.add_argument('--precision', type=str, choices=['fp32', 'bf16'], help='Training precision (default: TRAINING_CONFIG)')
 
     args = parser.parse_args()
 
+    # Training runs offline, so missing NLTK data can be fetched here
+    ensure_nltk_resources(download=True)
+
     # Generate synthetic data if needed
     if args.data is None and not os.path.exists(FILE_PATHS["synthetic_data_path"]):
         data_path = generate_synthetic_data(num_samples=args.samples)
@@ -236,7 +344,15 @@ def main():
         model_save_path=args.output or FILE_PATHS["model_save_path"],
         epochs=args.epochs,
         batch_size=args.batch_size,
-        patience=args.patience
+        patience=args.patience,
+        quantize=args.quantize,
+        max_accuracy_drop=args.max_accuracy_drop,
+        use_dataset_cache=False if args.no_dataset_cache else None,
+        precision=args.precision,
+        accum_steps=args.accum_steps,
+        checkpoint_path=args.checkpoint,
+        resume=args.resume,
+        eval_steps=args.eval_steps
     )
 
     # Plot training statistics
@@ -0,0 +1,197 @@
+"""
+Unpadded training datasets, length-bucketed batching and per-batch padding.
+"""
+
+import torch
+from torch.utils.data import Dataset, Sampler
+
+def pack_sequences(sequences):
+    """
+    Pack variable-length token id lists into one flat tensor.
+
+    Args:
+        sequences: List of token id lists
+
+    Returns:
+        Tuple of (flat token id tensor, tensor of sequence lengths)
+    """
+    lengths = torch.tensor([len(sequence) for sequence in sequences], dtype=torch.long)
+    token_ids = torch.tensor([token for sequence in sequences for token in sequence], dtype=torch.long)
+    return token_ids, lengths
+
+def select_sequences(token_ids, lengths, indices):
+    """
+    Select some sequences of a packed tensor, keeping them packed.
+
+    Args:
+        token_ids: Flat token id tensor
+        lengths: Tensor of sequence lengths
+        indices: Indices of the sequences to keep, in output order
+
+    Returns:
+        Tuple of (flat token id tensor, tensor of sequence lengths)
+    """
+    indices = torch.as_tensor(indices, dtype=torch.long)
+    starts = torch.cumsum(lengths, 0) - lengths
+
+    selected_lengths = lengths[indices]
+    selected_starts = torch.cumsum(selected_lengths, 0) - selected_lengths
+
+    # Position of every selected token in the source tensor
+    offsets = torch.arange(int(selected_lengths.sum())) - selected_starts.repeat_interleave(selected_lengths)
+    positions = starts[indices].repeat_interleave(selected_lengths) + offsets
+
+    return token_ids[positions], selected_lengths
+
+class PackedSequenceDataset(Dataset):
+    """
+    Dataset of unpadded token id sequences stored in one flat tensor.
+
+    Items are (token ids, label) pairs, or token ids alone when there are no
+    labels; PadCollator pads them per batch.
+    """
+
+    def __init__(self, token_ids, lengths, labels=None):
+        """
+        Initialize the dataset.
+
+        Args:
+            token_ids: Flat token id tensor
+            lengths: Tensor of sequence lengths
+            labels: Optional tensor of labels
+        """
+        self.token_ids = token_ids
+        self.lengths = lengths
+        self.labels = labels
+        self.starts = (torch.cumsum(lengths, 0) - lengths).tolist()
+        self._lengths = lengths.tolist()
+
+    def __len__(self):
+        return len(self._lengths)
+
+    def __getitem__(self, index):
+        start = self.starts[index]
+        sequence = self.token_ids[start:start + self._lengths[index]]
+        if self.labels is None:
+            return sequence
+        return sequence, self.labels[index]
+
+class LengthBucketSampler(Sampler):
+    """
+    Batch sampler grouping sequences of similar length.
+
+    When shuffling, the dataset is shuffled, split into pools of
+    batch_size * bucket_size_multiplier sequences, each pool is sorted by
+    length and cut into batches, and the batch order is shuffled. Batches
+    therefore need little padding while still mixing the data between
+    epochs. Without shuffling, all sequences are sorted by length.
+
+    The shuffle is drawn from the seed and the epoch set with set_epoch, so
+    a run is reproducible and can be resumed part way through an epoch.
+    """
+
+    def __init__(self, lengths, batch_size, shuffle=True, bucket_size_multiplier=50, seed=0, drop_last=False):
+        """
+        Initialize the sampler.
+
+        Args:
+            lengths: Tensor or list of sequence lengths
+            batch_size: Sequences per batch
+            shuffle: Shuffle the data each epoch
+            bucket_size_multiplier: Batches per length-sorted pool
+            seed: Base random seed
+            drop_last: Drop the last incomplete batch of each pool
+        """
+        self.lengths = torch.as_tensor(lengths, dtype=torch.long)
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.pool_size = batch_size * bucket_size_multiplier
+        self.seed = seed
+        self.drop_last = drop_last
+        self.epoch = 0
+        self.start_batch = 0
+
+    def set_epoch(self, epoch, start_batch=0):
+        """
+        Set the epoch used to draw the shuffle.
+
+        Args:
+            epoch: Epoch number
+            start_batch: Batches of the epoch to skip, when resuming part way through
+        """
+        self.epoch = epoch
+        self.start_batch = start_batch
+
+    def _batches(self):
+        """Return the batches of dataset indices for the current epoch."""
+        if not self.shuffle:
+            pools = [torch.argsort(self.lengths, stable=True)]
+        else:
+            generator = torch.Generator()
+            generator.manual_seed(self.seed + self.epoch)
+            order = torch.randperm(len(self.lengths), generator=generator)
+            pools = [
+                pool[torch.argsort(self.lengths[pool], stable=True)]
+                for pool in torch.split(order, self.pool_size)
+            ]
+
+        batches = []
+        for pool in pools:
+            for batch in torch.split(pool, self.batch_size):
+                if self.drop_last and len(batch) < self.batch_size:
+                    continue
+                batches.append(batch.tolist())
+
+        if self.shuffle:
+            batch_order = torch.randperm(len(batches), generator=generator).tolist()
+            batches = [batches[i] for i in batch_order]
+        return batches
+
+    def __iter__(self):
+        return iter(self._batches()[self.start_batch:])
+
+    def __len__(self):
+        # Pool sizes only depend on the dataset size, not on the shuffle
+        num_sequences = len(self.lengths)
+        if self.shuffle:
+            pool_sizes = [min(self.pool_size, num_sequences - start) for start in range(0, num_sequences, self.pool_size)]
+        else:
+            pool_sizes = [num_sequences]
+
+        if self.drop_last:
+            return sum(size // self.batch_size for size in pool_sizes)
+        return sum((size + self.batch_size - 1) // self.batch_size for size in pool_sizes)
+
+class PadCollator:
+    """
+    Pads a batch of sequences to its longest sequence.
+
+    Batches are returned as (input_ids, attention_mask, labels), or
+    (input_ids, attention_mask) for unlabeled data, matching the fixed-length
+    tensors the training loop used before.
+    """
+
+    def __init__(self, pad_token_id=0):
+        """
+        Initialize the collator.
+
+        Args:
+            pad_token_id: Token id used for padding
+        """
+        self.pad_token_id = pad_token_id
+
+    def __call__(self, items):
+        labeled = isinstance(items[0], tuple)
+        sequences = [item[0] for item in items] if labeled else items
+
+        max_length = max(len(sequence) for sequence in sequences)
+        input_ids = torch.full((len(sequences), max_length), self.pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(sequences), max_length), dtype=torch.long)
+        for row, sequence in enumerate(sequences):
+            input_ids[row, :len(sequence)] = sequence
+            attention_mask[row, :len(sequence)] = 1
+
+        if not labeled:
+            return input_ids, attention_mask
+        labels = torch.stack([torch.as_tensor(item[1]) for item in items])
+        return input_ids, attention_mask, labels